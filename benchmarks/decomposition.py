@@ -0,0 +1,40 @@
+"""Compare the greedy and trie compound decompositions.
+
+    python -m benchmarks.decomposition
+
+Times uncached lookups of synthetic compounds under each algorithm and
+reports how many pieces each breakdown needs."""
+import tempfile
+import time
+from benchmarks.fixtures import build_dictionary_db, synthetic_headwords, compound_tokens
+from dictionary import ChineseDictionary
+
+def run(engine: str, decomposition: str, db_path, tokens) -> dict:
+    dictionary = ChineseDictionary(db_path, engine=engine, decomposition=decomposition)
+    pieces = 0
+    start = time.perf_counter()
+    for token in tokens:
+        dictionary.cache.clear()
+        result = dictionary.lookup(token)
+        breakdown = result['definitions'][0] if result else ''
+        pieces += breakdown.count(' + ') + 1
+    elapsed = time.perf_counter() - start
+    return {
+        'engine': engine,
+        'decomposition': decomposition,
+        'lookups_per_second': len(tokens) / elapsed,
+        'avg_pieces': pieces / len(tokens),
+    }
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = build_dictionary_db(tmp)
+        tokens = compound_tokens(synthetic_headwords())
+        print(f"{'engine':8} {'algorithm':10} {'lookups/s':>10} {'avg pieces':>11}")
+        for engine in ChineseDictionary.ENGINES:
+            for decomposition in ChineseDictionary.DECOMPOSITIONS:
+                r = run(engine, decomposition, db_path, tokens)
+                print(f"{r['engine']:8} {r['decomposition']:10} {r['lookups_per_second']:10.0f} {r['avg_pieces']:11.2f}")
+
+if __name__ == '__main__':
+    main()
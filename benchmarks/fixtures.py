@@ -0,0 +1,79 @@
+"""Synthetic CC-CEDICT data so benchmarks run offline without the real file"""
+import random
+from pathlib import Path
+
+# Common CJK block; 3000 characters is roughly the working set of real text
+CHARACTERS = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+SYLLABLES = ['ma', 'shi', 'zhong', 'guo', 'ren', 'hao', 'xue', 'lu:', 'nu:e', 'er',
+             'ai', 'ou', 'chuang', 'yuan', 'xiong', 'qiang', 'zhuang', 'yi', 'wu', 'jian']
+# Gloss vocabulary, most common first; definitions draw from it with Zipf-like
+# weights so a few words (like 'to') match a large share of entries
+GLOSS_WORDS = ('to of the a person see also surname old variant one place eat go make '
+               'water big small good bad time day year country language study write read '
+               'rice meal drink tea book car house door heart mind hand mouth eye head '
+               'mountain river tree flower bird fish horse dog cat king official army war '
+               'peace love fear happy sad fast slow high low long short new strong weak '
+               'red white black green gold silver stone fire wind rain snow cloud sun moon '
+               'star sky earth sea city village road bridge market shop money price work '
+               'rest sleep walk run fly swim sing dance play speak listen think know learn '
+               'teach buy sell give take open close begin end return arrive leave wait').split()
+GLOSS_WEIGHTS = [1 / (rank + 1) for rank in range(len(GLOSS_WORDS))]
+
+def synthetic_definitions(rng: random.Random) -> str:
+    """One to three slash-separated English glosses of one to three words"""
+    return '/'.join(' '.join(rng.choices(GLOSS_WORDS, GLOSS_WEIGHTS, k=rng.randint(1, 3)))
+                    for _ in range(rng.randint(1, 3)))
+
+def synthetic_headwords(entries: int = 120000, seed: int = 0) -> list:
+    """Headwords shaped like CC-CEDICT: every character, then mostly 2-character
+    words with a tail of 3- and 4-character idioms"""
+    rng = random.Random(seed)
+    words = list(CHARACTERS)
+    while len(words) < entries:
+        length = rng.choice([2, 2, 2, 2, 3, 4])
+        words.append(''.join(rng.choice(CHARACTERS) for _ in range(length)))
+    return list(dict.fromkeys(words))
+
+def write_cedict(path, entries: int = 120000, seed: int = 0) -> Path:
+    """Write a synthetic cedict.txt and return its path"""
+    rng = random.Random(seed)
+    path = Path(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# Synthetic CC-CEDICT fixture\n')
+        for word in synthetic_headwords(entries, seed):
+            reading = ' '.join(f"{rng.choice(SYLLABLES)}{rng.randint(1, 5)}" for _ in word)
+            f.write(f"{word} {word} [{reading}] /{synthetic_definitions(rng)}/\n")
+    return path
+
+def build_dictionary_db(directory, entries: int = 120000, seed: int = 0) -> Path:
+    """Build a dictionary database from a synthetic cedict.txt in directory"""
+    import ingest
+    directory = Path(directory)
+    cedict = write_cedict(directory / 'cedict.txt', entries, seed)
+    db_path = directory / 'dictionary.db'
+    if not db_path.exists():
+        ingest.build(db_path, cedict, progress=None)
+    return db_path
+
+def compound_tokens(headwords: list, count: int = 2000, seed: int = 1) -> list:
+    """Tokens made by gluing 2-3 headwords together, forcing the compound fallback"""
+    rng = random.Random(seed)
+    multi = [w for w in headwords if len(w) > 1]
+    return [''.join(rng.choice(multi) for _ in range(rng.randint(2, 3))) for _ in range(count)]
+
+def synthetic_corpus(chars: int, seed: int = 0) -> str:
+    """Chinese-looking text of roughly `chars` characters built from jieba's
+    own vocabulary, with sentence punctuation and paragraph breaks"""
+    import jieba
+    jieba.initialize()
+    rng = random.Random(seed)
+    vocabulary = sorted(w for w, freq in jieba.dt.FREQ.items() if freq > 100)
+    parts, size = [], 0
+    while size < chars:
+        sentence = ''.join(rng.choice(vocabulary) for _ in range(rng.randint(4, 15)))
+        sentence += rng.choice('，。。！？')
+        if rng.random() < 0.1:
+            sentence += '\n'
+        parts.append(sentence)
+        size += len(sentence)
+    return ''.join(parts)
@@ -0,0 +1,84 @@
+"""Word lookup latency while another reader's large submission is segmented.
+
+    python -m benchmarks.latency [characters]
+
+Runs the app in-process against a synthetic dictionary and times /lookup
+requests on their own, then again while a large text is being submitted
+and segmented in the background. Segmentation runs in a worker process
+and blocking work on the bounded executor, so lookups should stay close to
+the idle baseline: exits with status 1 if the p95 while segmenting is more
+than MAX_SLOWDOWN times the idle p95."""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from starlette.testclient import TestClient
+
+# Run against scratch databases so the real ones are untouched
+_scratch = Path(tempfile.mkdtemp(prefix='latency-bench-'))
+os.environ['DICTIONARY_DB'] = str(_scratch / 'dictionary.db')
+os.environ['SAVED_WORDS_DB'] = str(_scratch / 'saved_words.db')
+os.environ['LIBRARY_DB'] = str(_scratch / 'library.db')
+
+from benchmarks.fixtures import build_dictionary_db, synthetic_corpus, synthetic_headwords
+import main as reader
+
+HEADERS = {'HX-Request': 'true'}
+# Allowed ratio of p95 lookup latency while segmenting to the idle p95
+MAX_SLOWDOWN = 2.0
+
+def time_lookups(client, words) -> list:
+    latencies = []
+    for word in words:
+        start = time.perf_counter()
+        response = client.post(f'/lookup/{word}')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+    return latencies
+
+def p95(latencies) -> float:
+    return sorted(latencies)[int(len(latencies) * 0.95)]
+
+def summary(latencies) -> str:
+    ms = sorted(l * 1000 for l in latencies)
+    return (f"p50 {statistics.median(ms):6.2f} ms  p95 {p95(ms):6.2f} ms  "
+            f"max {ms[-1]:6.2f} ms  ({len(ms)} lookups)")
+
+def main():
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    text = synthetic_corpus(chars)
+    headwords = synthetic_headwords()
+    rng = random.Random(0)
+
+    build_dictionary_db(_scratch)
+
+    with TestClient(reader.app, headers=HEADERS) as client, TestClient(reader.app, headers=HEADERS) as submitter:
+        time_lookups(client, rng.sample(headwords, 200))  # warm connections
+        idle = time_lookups(client, rng.sample(headwords, 500))
+        print(f"idle:       {summary(idle)}")
+
+        submitted = threading.Event()
+        def submit():
+            submitter.post('/', data={'content': text})
+            submitted.set()
+        threading.Thread(target=submit, daemon=True).start()
+
+        busy, start = [], time.perf_counter()
+        while not submitted.is_set() or reader.segmentations:
+            busy += time_lookups(client, rng.sample(headwords, 20))
+        elapsed = time.perf_counter() - start
+        print(f"segmenting: {summary(busy)}")
+        print(f"{len(text)} characters segmented in {elapsed:.1f} s")
+        print(f"executor: {reader.blocking.executor.stats()}")
+
+    slowdown = p95(busy) / p95(idle)
+    print(f"p95 slowdown while segmenting: {slowdown:.2f}x (allowed {MAX_SLOWDOWN:.1f}x)")
+    if slowdown > MAX_SLOWDOWN:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Reopening a stored document versus segmenting it again.
+
+    python -m benchmarks.library [characters]
+
+Adds a synthetic text to a scratch library, then times reopening it from
+disk (decompressing the text and rebuilding token ends from the stored
+lengths) and from the decoded cache, against jieba.cut on the same text."""
+import sys
+import tempfile
+import time
+from pathlib import Path
+import jieba
+from benchmarks.fixtures import synthetic_corpus
+from services.documents import Document
+from services.library import DocumentLibrary
+from services.tokens import TokenSpans
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    text = synthetic_corpus(chars)
+    jieba.initialize()
+    spans, cut_ms = timed(lambda: TokenSpans.from_tokens(text, jieba.cut(text)))
+    n = len(spans)
+    print(f"{len(text)} characters, {n} tokens")
+    print(f"jieba.cut:            {cut_ms:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = DocumentLibrary(Path(tmp) / 'library.db')
+        document = Document(text=text, words=spans)
+        _, add_ms = timed(lambda: library.add(document, 'benchmark'))
+        print(f"library.add:          {add_ms:8.1f} ms")
+        stats = library.stats()
+        print(f"stored text:          {stats['text_bytes'] / len(text.encode('utf-8')):8.1%} of UTF-8")
+        print(f"stored boundaries:    {stats['token_bytes'] * 8 / n:8.2f} bits/token "
+              f"(to_bytes: {len(spans.to_bytes()) * 8 / n:.0f})")
+
+        reopened = DocumentLibrary(Path(tmp) / 'library.db')
+        opened, open_ms = timed(lambda: reopened.open(document.digest))
+        assert opened.words.ends == spans.ends
+        print(f"open (from disk):     {open_ms:8.1f} ms")
+        _, cached_ms = timed(lambda: reopened.open(document.digest))
+        print(f"open (cached):        {cached_ms:8.3f} ms")
+
+if __name__ == '__main__':
+    main()
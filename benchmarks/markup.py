@@ -0,0 +1,32 @@
+"""Reader page size and render time: card-per-word markup versus compact spans.
+
+    python -m benchmarks.markup [pages]
+"""
+import gzip
+import sys
+import time
+import jieba
+from fasthtml.common import to_xml
+from benchmarks.fixtures import synthetic_corpus
+import main as reader
+
+def render(pages, markup: str):
+    start = time.perf_counter()
+    html = [to_xml(reader.mk_words(words, markup=markup), indent=False) for words in pages]
+    return html, time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    tokens = list(jieba.cut(synthetic_corpus(count * reader.WORDS_PER_PAGE * 2)))
+    size = reader.WORDS_PER_PAGE
+    pages = [tokens[i:i + size] for i in range(0, count * size, size)]
+    print(f"{len(pages)} pages of {size} words")
+    for markup in ('cards', 'compact'):
+        html, elapsed = render(pages, markup)
+        raw = sum(len(h.encode('utf-8')) for h in html) / len(html)
+        gzipped = sum(len(gzip.compress(h.encode('utf-8'))) for h in html) / len(html)
+        print(f"{markup:8} {raw / 1024:6.1f} KB/page ({gzipped / 1024:5.1f} KB gzipped), "
+              f"{elapsed / len(html) * 1000:6.2f} ms/page to render")
+
+if __name__ == '__main__':
+    main()
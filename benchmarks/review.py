@@ -0,0 +1,83 @@
+"""Review queue selection: the old load-everything version versus SQL selection.
+
+    python -m benchmarks.review [sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the saved words database at a scratch file before db is imported
+_scratch = tempfile.mkdtemp(prefix='review-bench-')
+os.environ['SAVED_WORDS_DB'] = os.path.join(_scratch, 'saved_words.db')
+
+from db import SavedWord, create_tables, get_db, get_words_for_review
+from db.models import get_tables
+
+def legacy_words_for_review(limit: int = 10):
+    """The original implementation, kept as the baseline and ordering reference"""
+    saved_words, review_stats = get_tables()
+    current_time = time.time()
+    all_saved_words = saved_words()
+    if not all_saved_words:
+        return []
+    reviewed_words = {r['word']: r for r in review_stats()}
+    new_words, due_words, future_words = [], [], []
+    for word in all_saved_words:
+        word_id = word['word']
+        if word_id not in reviewed_words:
+            new_words.append(SavedWord(**word))
+        else:
+            stats = reviewed_words[word_id]
+            if stats['next_review'] <= current_time:
+                overdue_days = (current_time - stats['next_review']) / 86400
+                priority = overdue_days + stats['incorrect_count']
+                due_words.append((priority, SavedWord(**word)))
+            else:
+                priority = stats['incorrect_count'] - (stats['next_review'] - current_time) / 86400
+                future_words.append((priority, SavedWord(**word)))
+    due_words.sort(reverse=True, key=lambda x: x[0])
+    future_words.sort(reverse=True, key=lambda x: x[0])
+    review_words = new_words + [w for _, w in due_words] + [w for _, w in future_words]
+    return review_words[:limit]
+
+def populate(count: int, new_share: float, seed: int = 0) -> None:
+    """Replace the tables with `count` saved words, `new_share` of them never reviewed"""
+    rng = random.Random(seed)
+    db, now = get_db(), time.time()
+    db.execute("DELETE FROM saved_words")
+    db.execute("DELETE FROM review_stats")
+    words, stats = [], []
+    for i in range(count):
+        word = f"w{i}"
+        words.append((word, word, word, 'pin1', 'definition', now - count + i))
+        if rng.random() >= new_share:
+            # Roughly half due, half in the future, with whole-day ties
+            next_review = now + rng.randint(-30, 30) * 86400
+            stats.append((word, rng.randint(0, 5), rng.randint(0, 5), now, next_review, 2.5, 1.0))
+    with db.conn:
+        db.conn.executemany("INSERT INTO saved_words VALUES (?, ?, ?, ?, ?, ?)", words)
+        db.conn.executemany("INSERT INTO review_stats VALUES (?, ?, ?, ?, ?, ?, ?)", stats)
+
+def timed(func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    create_tables()
+    print(f"{'words':>8} {'new':>5} {'legacy ms':>10} {'sql ms':>8}")
+    for size in sizes:
+        for new_share in (0.1, 0.0):
+            populate(size, new_share)
+            repeat = max(1, 20_000 // size)
+            legacy, expected = timed(legacy_words_for_review, repeat)
+            sql, result = timed(get_words_for_review, repeat * 10)
+            assert [w.word for w in result] == [w.word for w in expected], "ordering differs"
+            print(f"{size:>8} {new_share:>5.0%} {legacy * 1000:>10.2f} {sql * 1000:>8.3f}")
+
+if __name__ == '__main__':
+    main()
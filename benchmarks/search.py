@@ -0,0 +1,64 @@
+"""Reverse search latency: English and pinyin queries against the indexed search.
+
+    python -m benchmarks.search
+
+Builds the synthetic dictionary (CC-CEDICT sized) and times
+ChineseDictionary.search for common and rare English words, toneless
+pinyin and Chinese prefixes, on the first and a later page, with SQLite's
+page cache warm but the search result cache cleared before every query (a
+cached page costs microseconds). Collecting every LIKE match over the
+definitions is timed alongside as the unindexed baseline."""
+import random
+import statistics
+import tempfile
+import time
+from benchmarks.fixtures import GLOSS_WORDS, SYLLABLES, build_dictionary_db, synthetic_headwords
+from dictionary import ChineseDictionary
+
+def timed(func, queries) -> list:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return sorted(latencies)
+
+def report(name: str, ms: list) -> None:
+    print(f"{name:28} p50 {statistics.median(ms):7.2f} ms  p95 {ms[int(len(ms) * 0.95)]:7.2f} ms  max {ms[-1]:7.2f} ms")
+
+def main():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = build_dictionary_db(tmp)
+        dictionary = ChineseDictionary(db_path)
+        syllables = [s.replace(':', '') for s in SYLLABLES]
+        headwords = synthetic_headwords()
+        queries = {
+            'english common': ['to', 'of', 'the', 'to eat', 'person', 'see also', 'to the of', 'to the'],
+            'english typing': ['pe', 'per', 'pers', 'perso', 'sur', 'surn', 'surna', 'va', 'var', 'vari', 'mou', 'moun'],
+            'english rare': rng.sample(GLOSS_WORDS[-60:], 30),
+            'english phrase': [' '.join(rng.sample(GLOSS_WORDS[:40], 2)) for _ in range(30)],
+            'pinyin toneless': [''.join(rng.sample(syllables, 2)) for _ in range(30)],
+            'pinyin prefix': rng.sample(syllables, 10) + [s[:2] for s in rng.sample(syllables, 10)],
+            'chinese prefix': [w[:1] for w in rng.sample(headwords, 30)],
+        }
+        for qs in queries.values():
+            for q in qs:
+                dictionary.search(q)
+        def search(query, offset=0):
+            dictionary.search_cache.clear()
+            return dictionary.search(query, offset=offset)
+        for name, qs in queries.items():
+            report(name, timed(search, qs * 3))
+            report(f"{name} (page 6)", timed(lambda q: search(q, offset=100), qs * 3))
+        every_query = [q for qs in queries.values() for q in qs]
+        for q in every_query:
+            dictionary.search(q)
+        report('cached page', timed(dictionary.search, every_query))
+
+        with dictionary._pool.connection() as conn:
+            scan = lambda q: conn.execute("SELECT rowid FROM entries WHERE definitions LIKE ?", (f'%{q}%',)).fetchall()
+            report('LIKE scan (rare words)', timed(scan, queries['english rare']))
+
+if __name__ == '__main__':
+    main()
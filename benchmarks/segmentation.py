@@ -0,0 +1,40 @@
+"""Throughput of serial versus process-pool segmentation.
+
+    python -m benchmarks.segmentation [characters]
+
+Checks that the parallel output is identical to a serial jieba.cut and
+reports characters per second at 1, 2, 4 and 8 workers."""
+import sys
+import time
+import jieba
+from benchmarks.fixtures import synthetic_corpus
+from services.segmentation import cut_parallel, process_pool
+from services.tokens import TokenSpans
+
+def main():
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    text = synthetic_corpus(chars)
+    jieba.initialize()
+
+    start = time.perf_counter()
+    serial = TokenSpans.from_tokens(text, jieba.cut(text))
+    serial_time = time.perf_counter() - start
+    print(f"{len(text)} characters, {len(serial)} tokens")
+    print(f"serial     {serial_time:6.2f} s  {len(text) / serial_time / 1e6:5.2f} M chars/s")
+
+    for workers in (1, 2, 4, 8):
+        pool = process_pool(workers)
+        # Fork the workers before timing
+        list(pool.map(str, range(workers)))
+        start = time.perf_counter()
+        spans = TokenSpans(text)
+        for lengths in cut_parallel(text, pool):
+            spans.extend_lengths(lengths)
+        elapsed = time.perf_counter() - start
+        pool.shutdown()
+        identical = spans.ends == serial.ends
+        print(f"{workers} workers  {elapsed:6.2f} s  {len(text) / elapsed / 1e6:5.2f} M chars/s  "
+              f"x{serial_time / elapsed:4.2f}  identical={identical}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Offline benchmark suite for the reader's hot paths, written to JSON.
+
+    python -m benchmarks.suite [--quick] [--output results.json]
+    python -m benchmarks.suite --compare before.json after.json
+
+Builds a synthetic CC-CEDICT dictionary and scratch saved-words database,
+so nothing depends on the real data files. Each result records the time
+per operation (mean, p50, p95) for comparison across commits."""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Imported first: it points SAVED_WORDS_DB at a scratch file before db is loaded
+from benchmarks.review import populate
+from benchmarks.fixtures import GLOSS_WORDS, SYLLABLES, build_dictionary_db, compound_tokens, synthetic_corpus, synthetic_headwords
+import jieba
+from fasthtml.common import to_xml
+from db import create_tables, get_db, get_words_for_review, update_review_stats
+from dictionary import ChineseDictionary
+from services.documents import Document
+from services.library import DocumentLibrary
+from services.tokens import TokenSpans
+import main as reader
+
+def measure(func, inputs, unit: int = 1) -> dict:
+    """Time func on each input; `unit` is the amount of work per call (e.g. characters)"""
+    times = []
+    for item in inputs:
+        start = time.perf_counter()
+        func(item)
+        times.append(time.perf_counter() - start)
+    ms = sorted(t * 1000 for t in times)
+    total = sum(times)
+    return {
+        'calls': len(times),
+        'mean_ms': total * 1000 / len(times),
+        'p50_ms': statistics.median(ms),
+        'p95_ms': ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        'per_second': len(times) * unit / total,
+    }
+
+def bench_lookups(db_path, quick: bool) -> dict:
+    rng = random.Random(0)
+    headwords = synthetic_headwords()
+    hits = rng.sample(headwords, 500 if quick else 5000)
+    compounds = compound_tokens(headwords, 200 if quick else 2000)
+    results = {}
+    for engine in ChineseDictionary.ENGINES:
+        dictionary = ChineseDictionary(db_path, engine=engine)
+
+        def uncached(word):
+            dictionary.cache.clear()
+            dictionary.lookup(word)
+
+        results[f'lookup_hit[{engine}]'] = measure(uncached, hits)
+        dictionary.prefetch(hits)
+        results[f'lookup_hit_cached[{engine}]'] = measure(dictionary.lookup, hits)
+        results[f'lookup_compound[{engine}]'] = measure(uncached, compounds)
+
+    syllables = [s.replace(':', '') for s in SYLLABLES]
+    english = [' '.join(rng.sample(GLOSS_WORDS, rng.randint(1, 2))) for _ in range(50 if quick else 300)]
+    readings = [''.join(rng.sample(syllables, 2)) for _ in range(50 if quick else 300)]
+    results['search[english]'] = measure(dictionary.search, english)
+    results['search[pinyin]'] = measure(dictionary.search, readings)
+    return results
+
+def bench_pinyin(db_path, quick: bool) -> dict:
+    rng = random.Random(0)
+    dictionary = ChineseDictionary(db_path, engine='memory')
+    readings = [' '.join(f"{rng.choice(SYLLABLES)}{rng.randint(1, 5)}" for _ in range(rng.randint(1, 4)))
+                for _ in range(2000 if quick else 20000)]
+    return {'convert_pinyin': measure(dictionary._convert_pinyin, readings)}
+
+def bench_segmentation(quick: bool) -> dict:
+    jieba.initialize()
+    sizes = {'small': 1_000, 'medium': 100_000, 'novel': 300_000 if quick else 1_000_000}
+    results = {}
+    for name, chars in sizes.items():
+        text = synthetic_corpus(chars)
+        repeat = max(1, (100_000 if quick else 1_000_000) // chars)
+        results[f'jieba_cut[{name}]'] = measure(lambda t: list(jieba.cut(t)), [text] * repeat, unit=len(text))
+        results[f'jieba_cut[{name}]']['characters'] = len(text)
+    return results
+
+def bench_render(quick: bool) -> dict:
+    size = reader.WORDS_PER_PAGE
+    count = 20 if quick else 100
+    tokens = list(jieba.cut(synthetic_corpus(count * size * 2)))
+    pages = [tokens[i:i + size] for i in range(0, count * size, size)]
+    render = lambda words: to_xml(reader.mk_words(words, markup='cards'), indent=False)
+    return {'render_word_spans_page': measure(render, pages, unit=size)}
+
+def bench_library(quick: bool) -> dict:
+    text = synthetic_corpus(300_000 if quick else 1_000_000)
+    document = Document(text=text, words=TokenSpans.from_tokens(text, jieba.cut(text)))
+    with tempfile.TemporaryDirectory() as tmp:
+        library = DocumentLibrary(Path(tmp) / 'library.db')
+        library.add(document, 'benchmark')
+
+        def reopen(_):
+            library._cache.clear()
+            library.open(document.digest)
+
+        return {'library_open[novel]': measure(reopen, range(5 if quick else 20), unit=len(text))}
+
+def bench_review(quick: bool) -> dict:
+    create_tables()
+    results = {}
+    for size in ([1_000, 10_000] if quick else [1_000, 10_000, 100_000]):
+        populate(size, new_share=0.0)
+        results[f'get_words_for_review[{size}]'] = measure(lambda _: get_words_for_review(10), range(50))
+
+    rng, now = random.Random(0), time.time()
+    words = [f"w{rng.randrange(1_000)}" for _ in range(500 if quick else 2000)]
+    populate(1_000, new_share=0.5)
+    update = lambda word: update_review_stats(word, rng.random() < 0.7, now + 86400, 1.0, 2.5)
+    results['update_review_stats'] = measure(update, words)
+    get_db().execute("DELETE FROM saved_words")
+    get_db().execute("DELETE FROM review_stats")
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run(quick: bool) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = build_dictionary_db(tmp)
+        for bench in (bench_lookups, bench_pinyin):
+            print(f"Running {bench.__name__}...", file=sys.stderr)
+            results.update(bench(db_path, quick))
+    for bench in (bench_segmentation, bench_render, bench_library, bench_review):
+        print(f"Running {bench.__name__}...", file=sys.stderr)
+        results.update(bench(quick))
+    return {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+def compare(before_path, after_path) -> None:
+    before, after = (json.loads(Path(p).read_text()) for p in (before_path, after_path))
+    print(f"{'benchmark':34} {before['commit']:>10} {after['commit']:>10} {'change':>8}")
+    for name, result in after['results'].items():
+        if name in before['results']:
+            old, new = before['results'][name]['mean_ms'], result['mean_ms']
+            print(f"{name:34} {old:9.3f}ms {new:9.3f}ms {(new - old) / old:+8.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='smaller inputs for a fast smoke run')
+    parser.add_argument('--output', help='JSON file to write (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.quick)
+    output = Path(args.output or Path(__file__).parent / 'results' / f"{report['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    for name, result in report['results'].items():
+        print(f"{name:34} mean {result['mean_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms")
+    print(f"Wrote {output}")
+
+if __name__ == '__main__':
+    main()
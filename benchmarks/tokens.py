@@ -0,0 +1,37 @@
+"""Memory cost of a segmented document: list of str versus TokenSpans.
+
+    python -m benchmarks.tokens [characters]
+"""
+import sys
+import time
+import jieba
+from benchmarks.fixtures import synthetic_corpus
+from services.tokens import TokenSpans
+
+def list_bytes(tokens) -> int:
+    return sys.getsizeof(tokens) + sum(sys.getsizeof(t) for t in tokens)
+
+def main():
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    text = synthetic_corpus(chars)
+    tokens = list(jieba.cut(text))
+    spans = TokenSpans.from_tokens(text, tokens)
+    assert list(spans) == tokens
+
+    n = len(tokens)
+    print(f"{len(text)} characters, {n} tokens")
+    print(f"list[str]:  {list_bytes(tokens) / n:6.1f} bytes/token")
+    print(f"TokenSpans: {spans.memory_usage() / n:6.1f} bytes/token")
+
+    start = time.perf_counter()
+    for page in range(0, n, 200):
+        tokens[page:page + 200]
+    list_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for page in range(0, n, 200):
+        spans[page:page + 200]
+    spans_time = time.perf_counter() - start
+    print(f"slicing every page: list {list_time * 1000:.1f} ms, spans {spans_time * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,17 @@
-from .models import SavedWord, ReviewStats
+from .models import SavedWord, ReviewStats, get_db, create_tables, connections
 from .operations import (
     save_word,
     delete_word,
     get_all_saved_words,
+    get_saved_words_page,
+    get_saved_word,
+    count_saved_words,
     is_word_saved,
+    saved_words_among,
+    saved_words_version,
     update_review_stats,
+    claim_answer,
+    forget_answers,
     get_review_stats,
     get_words_for_review
 ) 
\ No newline at end of file
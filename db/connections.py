@@ -0,0 +1,272 @@
+import queue
+import apsw
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from fasthtml.common import database
+import metrics
+
+# Read-only dictionary connections: refuse writes, map the file into memory
+# and keep a generous page cache since the data never changes under us
+READ_ONLY_PRAGMAS = {
+    'query_only': 'ON',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -16000,  # negative values are KiB, so ~16 MB
+    'synchronous': 'OFF',
+}
+
+# Saved-words connections: WAL makes NORMAL durable enough, and a busy
+# timeout lets concurrent writers queue instead of failing with SQLITE_BUSY
+READ_WRITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -8000,
+    'busy_timeout': 5000,
+}
+
+def apply_pragmas(conn, pragmas: dict) -> None:
+    """Apply PRAGMA settings to a sqlite3 or apsw connection"""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name}={value}')
+
+class CountingCursor(sqlite3.Cursor):
+    """sqlite3 cursor that counts the statements it runs in /metrics.
+
+    Counted per call rather than with set_trace_callback, which also fires
+    for the statements FTS5 runs internally (one per matching row, so a
+    Python call per row and counts in the tens of thousands per search)."""
+
+    def _count(self) -> None:
+        if self.connection.database is not None:
+            metrics.count_query(self.connection.database)
+
+    def execute(self, sql, parameters=()):
+        self._count()
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        def counted():
+            for parameters in seq_of_parameters:
+                self._count()
+                yield parameters
+        return super().executemany(sql, counted())
+
+class CountingConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are counted under `database`, once trace_queries() sets it"""
+    database = None
+
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def trace_queries(conn, database: str) -> None:
+    """Count every statement run on a CountingConnection or apsw connection in /metrics"""
+    if isinstance(conn, apsw.Connection):
+        # apsw aborts the statement if the tracer returns a false value
+        conn.exec_trace = lambda cursor, sql, bindings: metrics.count_query(database) or True
+    else:
+        conn.database = database
+
+class ConnectionPool:
+    """Fixed-size pool of reusable read-only sqlite3 connections.
+
+    Connections are opened lazily up to `size`; once all are checked out,
+    callers block until one is returned."""
+
+    def __init__(self, path, size: int = 4, pragmas: dict = READ_ONLY_PRAGMAS):
+        self.path = Path(path)
+        self.size = size
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"{self.path.resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=CountingConnection)
+        apply_pragmas(conn, self.pragmas)
+        trace_queries(conn, self.path.stem)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+
+        # Pool exhausted: wait for another request to hand a connection back
+        start = time.perf_counter()
+        conn = self._idle.get()
+        with self._lock:
+            self._waits += 1
+            self._wait_time += time.perf_counter() - start
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def stats(self) -> dict:
+        """Pool usage counters"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+            }
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+class ThreadLocalDatabase:
+    """Gives each thread its own fastlite Database on the same file.
+
+    Request handlers run on a thread pool, so this avoids every request
+    serialising on one shared connection while keeping connections warm
+    across requests handled by the same worker thread."""
+
+    def __init__(self, path, pragmas: dict = READ_WRITE_PRAGMAS):
+        self.path = Path(path)
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._checkouts = 0
+
+    def get(self):
+        """Return the calling thread's Database, opening it on first use"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = database(self.path)
+            apply_pragmas(db, self.pragmas)
+            trace_queries(db.conn, self.path.stem)
+            self._local.db = db
+            with self._lock:
+                self._opened += 1
+        with self._lock:
+            self._checkouts += 1
+        return db
+
+    def stats(self) -> dict:
+        """Connection usage counters"""
+        with self._lock:
+            return {
+                'opened': self._opened,
+                'checkouts': self._checkouts,
+            }
+
+class WalCheckpointer:
+    """Background thread that truncates write-ahead logs every `interval` seconds.
+
+    SQLite's automatic checkpoints copy pages back but never shrink the -wal
+    file, and are skipped entirely while readers hold old snapshots, so a
+    busy database's log grows without bound. TRUNCATE resets it to zero."""
+
+    def __init__(self, paths, interval: float = 300):
+        self.paths = [Path(p) for p in paths]
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {str(p): {'checkpoints': 0, 'busy': 0, 'last_duration': 0.0, 'max_duration': 0.0,
+                                'total_duration': 0.0, 'last_frames': 0} for p in self.paths}
+
+    def checkpoint(self, path: Path) -> tuple:
+        """Run wal_checkpoint(TRUNCATE) on one database; returns (busy, log frames, checkpointed frames)"""
+        start = time.perf_counter()
+        # Must be the same SQLite library as the fastlite connections: closing a
+        # second library's handle on the file would drop their POSIX locks
+        conn = apsw.Connection(str(path))
+        try:
+            apply_pragmas(conn, {'busy_timeout': 5000})
+            result = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        finally:
+            conn.close()
+        duration = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats[str(path)]
+            stats['checkpoints'] += 1
+            stats['busy'] += result[0]
+            stats['last_duration'] = duration
+            stats['max_duration'] = max(stats['max_duration'], duration)
+            stats['total_duration'] += duration
+            stats['last_frames'] = result[1]
+        return result
+
+    def run_once(self) -> None:
+        for path in self.paths:
+            if path.exists():
+                try:
+                    self.checkpoint(path)
+                except apsw.Error as e:
+                    print(f"WAL checkpoint of {path} failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """Per database: current -wal size and checkpoint counters/durations (seconds)"""
+        with self._lock:
+            stats = {path: dict(values) for path, values in self._stats.items()}
+        for path in self.paths:
+            wal = path.with_name(path.name + '-wal')
+            stats[str(path)]['wal_bytes'] = wal.stat().st_size if wal.exists() else 0
+            stats[str(path)]['db_bytes'] = path.stat().st_size if path.exists() else 0
+        return stats
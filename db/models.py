@@ -1,38 +1,73 @@
-from fasthtml.common import database
+import os
 from pathlib import Path
 from dataclasses import dataclass
+from .connections import READ_WRITE_PRAGMAS, ThreadLocalDatabase
 
 # Ensure data directory exists
 Path('data').mkdir(exist_ok=True)
 
-# Initialize database
-db = database('data/saved_words.db')
-saved_words = db.t.saved_words
-review_stats = db.t.review_stats
-
-# Create tables if they don't exist
-if saved_words not in db.t:
-    saved_words.create(
-        word=str,
-        simplified=str,
-        traditional=str,
-        pinyin=str,
-        definitions=str,
-        timestamp=float,
-        pk='word'
-    )
-
-if review_stats not in db.t:
-    review_stats.create(
-        word=str,          # The word being reviewed
-        correct_count=int, # Number of times correctly guessed
-        incorrect_count=int, # Number of times incorrectly guessed
-        last_reviewed=float, # Timestamp of last review
-        next_review=float,  # Timestamp when word should be reviewed next
-        ease_factor=float,  # SRS ease factor (starts at 2.5, adjusted based on performance)
-        interval=float,     # Current interval in days
-        pk='word'
-    )
+# Each request thread gets its own connection to the saved words database
+SAVED_WORDS_DB = os.environ.get('SAVED_WORDS_DB', 'data/saved_words.db')
+# Pages of WAL after which a commit triggers an automatic checkpoint
+WAL_AUTOCHECKPOINT = int(os.environ.get('WAL_AUTOCHECKPOINT', '1000'))
+connections = ThreadLocalDatabase(SAVED_WORDS_DB, {**READ_WRITE_PRAGMAS, 'wal_autocheckpoint': WAL_AUTOCHECKPOINT})
+
+def get_db():
+    """Database connection for the calling thread"""
+    return connections.get()
+
+def get_tables():
+    """(saved_words, review_stats) tables on the calling thread's connection"""
+    db = get_db()
+    return db.t.saved_words, db.t.review_stats
+
+def create_tables():
+    """Create tables if they don't exist"""
+    db = get_db()
+    saved_words, review_stats = get_tables()
+    if saved_words not in db.t:
+        saved_words.create(
+            word=str,
+            simplified=str,
+            traditional=str,
+            pinyin=str,
+            definitions=str,
+            timestamp=float,
+            pk='word'
+        )
+
+    if review_stats not in db.t:
+        review_stats.create(
+            word=str,          # The word being reviewed
+            correct_count=int, # Number of times correctly guessed
+            incorrect_count=int, # Number of times incorrectly guessed
+            last_reviewed=float, # Timestamp of last review
+            next_review=float,  # Timestamp when word should be reviewed next
+            ease_factor=float,  # SRS ease factor (starts at 2.5, adjusted based on performance)
+            interval=float,     # Current interval in days
+            pk='word'
+        )
+
+    # Newest-first listing of saved words pages through this index
+    saved_words.create_index(['timestamp', 'word'], index_name='idx_saved_words_timestamp', if_not_exists=True)
+    # Review queues split words into due and not yet due on this; the other
+    # columns cover the priority expression so the split never reads the table
+    review_stats.create_index(['next_review', 'incorrect_count', 'word'],
+                              index_name='idx_review_stats_next_review', if_not_exists=True)
+
+    # Ids of batched review answers already applied, so a batch sent again
+    # after its response was lost is not counted twice
+    db.execute('CREATE TABLE IF NOT EXISTS review_answers (id TEXT PRIMARY KEY, applied_at REAL)')
+    db.execute('CREATE INDEX IF NOT EXISTS idx_review_answers_applied_at ON review_answers(applied_at)')
+
+    # Bumped by every save and removal, from any process, so rendered pages
+    # that highlight saved words can tell when theirs are out of date
+    db.execute('CREATE TABLE IF NOT EXISTS saved_words_version (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER)')
+    db.execute('INSERT OR IGNORE INTO saved_words_version (id, version) VALUES (0, 0)')
+    for event in ('INSERT', 'DELETE'):
+        db.execute(f'''CREATE TRIGGER IF NOT EXISTS saved_words_version_{event.lower()} AFTER {event} ON saved_words BEGIN
+            UPDATE saved_words_version SET version = version + 1;
+        END''')
 
 @dataclass
 class SavedWord:
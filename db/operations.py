@@ -1,105 +1,177 @@
+import functools
 import time
-from typing import List, Optional
-from .models import db, saved_words, review_stats, SavedWord, ReviewStats
+from typing import Iterable, List, Optional, Set, Tuple
+import metrics
+from .models import get_db, get_tables, SavedWord, ReviewStats
 
+def _timed(func):
+    """Record each call's duration in /metrics under the operation's name"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.DB_SECONDS.time(operation=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+@_timed
 def save_word(word_data: dict) -> SavedWord:
     """Save a word to the database"""
-    saved_words.insert({
-        'word': word_data['word'],
-        'simplified': word_data['simplified'],
-        'traditional': word_data['traditional'],
-        'pinyin': word_data['pinyin'],
-        'definitions': word_data['definitions'],
-        'timestamp': time.time()
-    })
-    return SavedWord(**word_data, timestamp=time.time())
+    timestamp = time.time()
+    # Saving a word again refreshes its entry and moves it to the top of the list
+    get_db().execute("""
+        INSERT INTO saved_words (word, simplified, traditional, pinyin, definitions, timestamp)
+        VALUES (:word, :simplified, :traditional, :pinyin, :definitions, :timestamp)
+        ON CONFLICT(word) DO UPDATE SET
+            simplified = excluded.simplified,
+            traditional = excluded.traditional,
+            pinyin = excluded.pinyin,
+            definitions = excluded.definitions,
+            timestamp = excluded.timestamp
+    """, {**{k: word_data[k] for k in ('word', 'simplified', 'traditional', 'pinyin', 'definitions')},
+          'timestamp': timestamp})
+    return SavedWord(**word_data, timestamp=timestamp)
 
+@_timed
 def delete_word(word: str) -> None:
     """Delete a word and its review stats from the database"""
-    if word in saved_words:
-        saved_words.delete(word)
-    if word in review_stats:
-        review_stats.delete(word)
+    db = get_db()
+    with db.conn:
+        db.execute("DELETE FROM saved_words WHERE word = ?", [word])
+        db.execute("DELETE FROM review_stats WHERE word = ?", [word])
 
+@_timed
 def get_all_saved_words(order_by: str = '-timestamp') -> List[SavedWord]:
     """Get all saved words, optionally ordered by a field"""
+    saved_words, _ = get_tables()
     words = saved_words(order_by=order_by)
     return [SavedWord(**word) for word in words]
 
+@_timed
+def get_saved_words_page(limit: int = 50, before: Optional[Tuple[float, str]] = None) -> List[SavedWord]:
+    """Up to `limit` saved words, newest first, starting after the `before` cursor.
+
+    The cursor is the (timestamp, word) of the last word on the previous page,
+    so each page is an index range scan however far into the list it is."""
+    db = get_db()
+    if before is None:
+        rows = db.q("SELECT * FROM saved_words ORDER BY timestamp DESC, word DESC LIMIT ?", [limit])
+    else:
+        rows = db.q("SELECT * FROM saved_words WHERE (timestamp, word) < (?, ?) "
+                    "ORDER BY timestamp DESC, word DESC LIMIT ?", [before[0], before[1], limit])
+    return [SavedWord(**row) for row in rows]
+
+@_timed
+def saved_words_among(words: Iterable[str]) -> Set[str]:
+    """The subset of words that are saved, in one query per 500 distinct words"""
+    words = list(set(words))
+    db, saved = get_db(), set()
+    for i in range(0, len(words), 500):
+        batch = words[i:i + 500]
+        rows = db.execute(f"SELECT word FROM saved_words WHERE word IN ({','.join('?' * len(batch))})", batch)
+        saved.update(row[0] for row in rows)
+    return saved
+
+@_timed
+def count_saved_words() -> int:
+    """Number of saved words"""
+    return get_db().execute("SELECT COUNT(*) FROM saved_words").fetchone()[0]
+
+@_timed
+def saved_words_version() -> int:
+    """Counter that changes whenever a word is saved or removed"""
+    return get_db().execute("SELECT version FROM saved_words_version").fetchone()[0]
+
+@_timed
+def get_saved_word(word: str) -> Optional[SavedWord]:
+    """A single saved word, or None if it is not saved"""
+    saved_words, _ = get_tables()
+    if word in saved_words:
+        return SavedWord(**saved_words[word])
+    return None
+
+@_timed
 def is_word_saved(word: str) -> bool:
     """Check if a word is saved"""
+    saved_words, _ = get_tables()
     return word in saved_words
 
+@_timed
 def update_review_stats(word: str, is_correct: bool, next_review: float, 
-                       interval: float, ease_factor: float) -> ReviewStats:
-    """Update review statistics for a word"""
-    stats = review_stats[word] if word in review_stats else {}
-    review_data = {
+                       interval: float, ease_factor: float, reviewed_at: Optional[float] = None) -> ReviewStats:
+    """Update review statistics for a word (reviewed now unless reviewed_at is given).
+
+    A single UPSERT creates the row or increments the counters in place."""
+    rows = get_db().q("""
+        INSERT INTO review_stats (word, correct_count, incorrect_count, last_reviewed, next_review, ease_factor, interval)
+        VALUES (:word, :correct, :incorrect, :last_reviewed, :next_review, :ease_factor, :interval)
+        ON CONFLICT(word) DO UPDATE SET
+            correct_count = correct_count + excluded.correct_count,
+            incorrect_count = incorrect_count + excluded.incorrect_count,
+            last_reviewed = excluded.last_reviewed,
+            next_review = excluded.next_review,
+            ease_factor = excluded.ease_factor,
+            interval = excluded.interval
+        RETURNING *
+    """, {
         'word': word,
-        'correct_count': stats.get('correct_count', 0) + (1 if is_correct else 0),
-        'incorrect_count': stats.get('incorrect_count', 0) + (0 if is_correct else 1),
-        'last_reviewed': time.time(),
+        'correct': 1 if is_correct else 0,
+        'incorrect': 0 if is_correct else 1,
+        'last_reviewed': reviewed_at if reviewed_at is not None else time.time(),
         'next_review': next_review,
         'ease_factor': ease_factor,
         'interval': interval
-    }
-    
-    if word in review_stats:
-        review_stats.update(review_data, word)
-    else:
-        review_stats.insert(review_data)
-    
-    return ReviewStats(**review_data)
+    })
+    return ReviewStats(**rows[0])
+
+@_timed
+def claim_answer(answer_id: str) -> bool:
+    """Record a review answer as applied; False if it already was"""
+    db = get_db()
+    db.execute('INSERT OR IGNORE INTO review_answers (id, applied_at) VALUES (?, ?)', (answer_id, time.time()))
+    return db.conn.changes() > 0
+
+@_timed
+def forget_answers(before: float) -> None:
+    """Drop the ids of answers applied before the given time"""
+    get_db().execute('DELETE FROM review_answers WHERE applied_at<?', (before,))
 
+@_timed
 def get_review_stats(word: str) -> Optional[ReviewStats]:
     """Get review statistics for a word"""
+    _, review_stats = get_tables()
     if word in review_stats:
         return ReviewStats(**review_stats[word])
     return None
 
+# Priority expressions match the original Python ordering: the most overdue
+# and most often missed first, then the soonest due among the rest
+DUE_PRIORITY = "(:now - r.next_review) / 86400.0 + r.incorrect_count"
+FUTURE_PRIORITY = "r.incorrect_count - (r.next_review - :now) / 86400.0"
+
+@_timed
 def get_words_for_review(limit: int = 10) -> List[SavedWord]:
-    """Get words that are due for review"""
-    current_time = time.time()
-    
-    # Get all saved words
-    all_saved_words = saved_words()
-    if not all_saved_words:
-        return []
-    
-    # Get words with review stats
-    reviewed_words = {r['word']: r for r in review_stats()}
-    
-    # Separate words into categories
-    new_words = []
-    due_words = []
-    future_words = []
-    
-    for word in all_saved_words:
-        word_id = word['word']
-        if word_id not in reviewed_words:
-            new_words.append(SavedWord(**word))
-        else:
-            stats = reviewed_words[word_id]
-            if stats['next_review'] <= current_time:
-                # Calculate priority based on how overdue and incorrect count
-                overdue_days = (current_time - stats['next_review']) / 86400
-                priority = overdue_days + stats['incorrect_count']
-                due_words.append((priority, SavedWord(**word)))
-            else:
-                # For words not due yet, prioritize by incorrect count and shorter intervals
-                priority = stats['incorrect_count'] - (stats['next_review'] - current_time) / 86400
-                future_words.append((priority, SavedWord(**word)))
-    
-    # Sort due and future words by priority (highest first)
-    due_words.sort(reverse=True, key=lambda x: x[0])
-    future_words.sort(reverse=True, key=lambda x: x[0])
-    
-    # Extract just the words from the priority tuples
-    due_words = [word for _, word in due_words]
-    future_words = [word for _, word in future_words]
-    
-    # Combine all words in priority order
-    review_words = new_words + due_words + future_words
-    
-    # Return all words if <= limit, otherwise return up to limit
-    return review_words if len(review_words) <= limit else review_words[:limit] 
\ No newline at end of file
+    """Get words that are due for review.
+
+    New (never reviewed) words come first in the order they were saved, then
+    due words, then words not yet due, each by priority. Selection, ordering
+    and the limit all happen in SQL, so only the returned rows are loaded."""
+    db = get_db()
+    params = {'now': time.time(), 'limit': limit}
+    queries = [
+        # Never reviewed
+        """SELECT s.* FROM saved_words s
+           WHERE NOT EXISTS (SELECT 1 FROM review_stats r WHERE r.word = s.word)
+           ORDER BY s.rowid LIMIT :limit""",
+        f"""SELECT s.* FROM review_stats r JOIN saved_words s ON s.word = r.word
+            WHERE r.next_review <= :now
+            ORDER BY {DUE_PRIORITY} DESC, s.rowid LIMIT :limit""",
+        f"""SELECT s.* FROM review_stats r JOIN saved_words s ON s.word = r.word
+            WHERE r.next_review > :now
+            ORDER BY {FUTURE_PRIORITY} DESC, s.rowid LIMIT :limit""",
+    ]
+    review_words = []
+    for query in queries:
+        params['limit'] = limit - len(review_words)
+        if params['limit'] <= 0:
+            break
+        review_words.extend(SavedWord(**row) for row in db.q(query, params))
+    return review_words
@@ -0,0 +1,82 @@
+"""Splitting unknown compounds into dictionary headwords.
+
+A HeadwordTrie holds every headword plus every proper prefix of one, which
+lets a scan from any position stop as soon as no longer headword can match.
+segment() uses it to find the breakdown with the fewest unknown characters
+and then the fewest segments, in one pass over the word and without
+touching the database."""
+import sqlite3
+import sys
+
+class HeadwordTrie:
+    """Prefix structure over dictionary headwords, stored as two hash sets"""
+
+    def __init__(self, headwords):
+        self.headwords = set()
+        self.prefixes = set()
+        self.max_length = 0
+        for word in headwords:
+            if not word:
+                continue
+            self.headwords.add(word)
+            self.max_length = max(self.max_length, len(word))
+            for k in range(1, len(word)):
+                self.prefixes.add(word[:k])
+
+    @classmethod
+    def from_db(cls, db_path):
+        """Build the trie from both headword forms in a dictionary database"""
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute('SELECT simplified, traditional FROM entries').fetchall()
+        finally:
+            conn.close()
+        return cls(word for row in rows for word in row)
+
+    def __contains__(self, word):
+        return word in self.headwords
+
+    def __len__(self):
+        return len(self.headwords)
+
+    def matches(self, text, start):
+        """End offsets of every headword starting at text[start], shortest first"""
+        for end in range(start + 1, min(len(text), start + self.max_length) + 1):
+            piece = text[start:end]
+            if piece in self.headwords:
+                yield end
+            if piece not in self.prefixes:
+                break
+
+    def segment(self, text):
+        """Split text into (piece, is_headword) pairs.
+
+        Minimises the number of characters left unmatched, then the number of
+        segments; remaining ties go to the longer leading segment."""
+        n = len(text)
+        # best[i] = (unknown characters, segments) for text[i:]
+        best = [(0, 0)] * (n + 1)
+        step = [1] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            # Leaving text[i] unmatched is always a candidate: it can beat a
+            # headword here that would use up the start of a better one
+            choice, cost = i + 1, (best[i + 1][0] + 1, best[i + 1][1] + 1)
+            for end in self.matches(text, i):
+                candidate = (best[end][0], best[end][1] + 1)
+                if candidate <= cost:
+                    choice, cost = end, candidate
+            best[i], step[i] = cost, choice - i
+
+        pieces = []
+        i = 0
+        while i < n:
+            piece = text[i:i + step[i]]
+            pieces.append((piece, piece in self.headwords))
+            i += step[i]
+        return pieces
+
+    def memory_usage(self):
+        """Approximate memory footprint of the trie in bytes"""
+        return (sys.getsizeof(self.headwords) + sys.getsizeof(self.prefixes)
+                + sum(sys.getsizeof(w) for w in self.headwords)
+                + sum(sys.getsizeof(p) for p in self.prefixes))
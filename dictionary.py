@@ -1,194 +1,352 @@
 from pathlib import Path
-import sqlite3
 import re
-import os
+import sqlite3
+import sys
+import time
+from db.connections import ConnectionPool
+import metrics
+import ingest
+import pinyin as pinyin_marks
+from cache import LRUCache
+from decompose import HeadwordTrie
+
+_MISSING = object()
+
+# Column order shared by every query that reads dictionary rows; the
+# tone-marked pinyin is precomputed at ingest time
+ENTRY_COLUMNS = 'traditional, simplified, pinyin_marked, definitions'
+
+class DictionaryIndex:
+    """Read-only in-memory index of dictionary entries.
+
+    Each row is stored once as a (traditional, simplified, pinyin_marked,
+    definitions) tuple and keyed on both its simplified and traditional forms. When several
+    entries share a headword the first one in CC-CEDICT file order (the
+    position column) wins, matching the row the SQLite query returns."""
+
+    def __init__(self, rows):
+        self._entries = {}
+        for row in rows:
+            row = tuple(row)
+            self._entries.setdefault(row[1], row)
+            self._entries.setdefault(row[0], row)
+
+    @classmethod
+    def from_db(cls, db_path):
+        """Build the index from the entries table of a dictionary database"""
+        conn = sqlite3.connect(db_path)
+        try:
+            return cls(conn.execute(f'SELECT {ENTRY_COLUMNS} FROM entries ORDER BY position'))
+        finally:
+            conn.close()
+
+    def get(self, word):
+        """Return the entry row for a simplified or traditional headword"""
+        return self._entries.get(word)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, word):
+        return word in self._entries
+
+    def memory_usage(self):
+        """Approximate memory footprint of the index in bytes"""
+        total = sys.getsizeof(self._entries)
+        seen = set()
+        for key, row in self._entries.items():
+            for obj in (key, row, *row):
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+        return total
 
 class ChineseDictionary:
-    # Pinyin tone marks mapping
-    _TONE_MARKS = {
-        'a': 'āáǎà',
-        'e': 'ēéěè',
-        'i': 'īíǐì',
-        'o': 'ōóǒò',
-        'u': 'ūúǔù',
-        'ü': 'ǖǘǚǜ',
-        'v': 'ǖǘǚǜ'  # v is used as ü in pinyin numbers
-    }
-    
-    # Order of vowels to check for adding tone marks
-    _VOWEL_PRIORITY = ['a', 'e', 'o', 'i', 'u', 'v']
-    
-    def __init__(self, db_path=None):
+    # Headwords per batched query; each is bound twice (simplified and
+    # traditional), keeping us under SQLite's 999 parameter limit
+    _BATCH_SIZE = 450
+    
+    # Lookup engines: 'sqlite' queries the database on every lookup,
+    # 'memory' loads it once into a DictionaryIndex
+    ENGINES = ('sqlite', 'memory')
+    
+    # Compound fallbacks: 'greedy' walks the word trying 2-character pairs
+    # then single characters; 'trie' finds the fewest-segment breakdown over
+    # headwords of any length using an in-memory HeadwordTrie
+    DECOMPOSITIONS = ('greedy', 'trie')
+    
+    # Chinese characters in a search query: 〇 and the CJK ideograph blocks
+    # (unified, extensions A to F and compatibility), not the kana, hangul
+    # and punctuation between them
+    _HANZI = re.compile(r'[\u3007\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0002fa1f]')
+    
+    # Prefix searches only order their first _PREFIX_WINDOW readings or
+    # headwords by length. Definitions are always ranked in full, with the
+    # broadest searches read from bm25 orders precomputed by ingest
+    _PREFIX_WINDOW = 2000
+    
+    def __init__(self, db_path=None, engine='sqlite', pool_size=4, cache=None, decomposition='greedy'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown dictionary engine {engine!r}, expected one of {self.ENGINES}")
+        if decomposition not in self.DECOMPOSITIONS:
+            raise ValueError(f"Unknown decomposition {decomposition!r}, expected one of {self.DECOMPOSITIONS}")
         if db_path is None:
             # Get the tutorials directory as project root
             project_root = Path(__file__).parent
             db_path = project_root / "data" / "dictionary.db"
         self.db_path = db_path
+        self.engine = engine
+        self.decomposition = decomposition
+        self._index = None
+        self._pool = None
+        self._trie = None
+        # Recent lookup results (including misses, stored as None)
+        self.cache = cache if cache is not None else LRUCache(max_entries=20000, max_bytes=32 * 1024 * 1024)
+        # Recent search result pages, keyed by (query, limit, offset)
+        self.search_cache = LRUCache(max_entries=2000, max_bytes=8 * 1024 * 1024)
         self._ensure_db()
+        if engine == 'memory':
+            self._index = DictionaryIndex.from_db(self.db_path)
+            print(f"Loaded {len(self._index)} headwords into memory ({self.memory_usage() / 1e6:.1f} MB)")
+            # Only search() uses the database, through a couple of connections
+            self._pool = ConnectionPool(self.db_path, size=2)
+        else:
+            self._pool = ConnectionPool(self.db_path, size=pool_size)
+        if decomposition == 'trie':
+            self._trie = HeadwordTrie.from_db(self.db_path)
+    
+    def memory_usage(self):
+        """Bytes held in memory by the lookup engine and decomposition trie"""
+        total = self._index.memory_usage() if self._index is not None else 0
+        if self._trie is not None:
+            total += self._trie.memory_usage()
+        return total
+    
+    def pool_stats(self):
+        """Connection pool counters (the memory engine only uses its pool for search)"""
+        return self._pool.stats()
     
     def _ensure_db(self):
         """Create the database and load dictionary if needed"""
         if not Path(self.db_path).exists():
             print(f"Creating new dictionary database at {self.db_path}")
-            self._create_db()
-            self._load_cedict()
+            ingest.build(self.db_path)
         else:
             print(f"Using existing dictionary database at {self.db_path}")
+            ingest.migrate(self.db_path)
     
-    def _create_db(self):
-        """Create the SQLite database schema"""
-        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''
-        CREATE TABLE IF NOT EXISTS entries (
-            traditional TEXT,
-            simplified TEXT,
-            pinyin TEXT,
-            definitions TEXT,
-            PRIMARY KEY (simplified, traditional)
-        )
-        ''')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_simplified ON entries(simplified)')
-        conn.commit()
-        conn.close()
-    
-    def _load_cedict(self):
-        """Load CC-CEDICT data into SQLite database"""
-        # Get the tutorials directory as project root
-        project_root = Path(__file__).parent
-        cedict_path = project_root / "data" / "cedict.txt"
-        
-        if not cedict_path.exists():
-            raise FileNotFoundError(f"CC-CEDICT file not found at {cedict_path}. Please ensure cedict.txt is in the tutorials/data directory.")
-        
-        print(f"Loading dictionary data from {cedict_path}")
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # CC-CEDICT line format: traditional simplified [pinyin] /definition 1/definition 2/
-        pattern = re.compile(r'^(\S+)\s+(\S+)\s+\[(.*?)\]\s+/(.+)/$')
+    def _convert_pinyin(self, pinyin):
+        """Convert numbered pinyin to pinyin with tone marks"""
+        return pinyin_marks.convert(pinyin)
+
+    def lookup(self, word):
+        """Look up a word in the dictionary"""
+        start = time.perf_counter()
+        result = self.cache.get(word, _MISSING)
+        if result is not _MISSING:
+            metrics.LOOKUP_SECONDS.observe(time.perf_counter() - start, result='cached')
+            return result
         
-        with open(cedict_path, 'r', encoding='utf-8') as f:
-            entries = []
-            total_entries = 0
-            
-            for line in f:
-                if line.startswith('#'):
-                    continue
-                    
-                match = pattern.match(line.strip())
-                if match:
-                    trad, simp, pinyin, defs = match.groups()
-                    entries.append((trad, simp, pinyin, defs))
-                    total_entries += 1
-                
-                # Batch insert every 1000 entries
-                if len(entries) >= 1000:
-                    c.executemany('INSERT OR REPLACE INTO entries VALUES (?,?,?,?)', entries)
-                    entries = []
-            
-            # Insert any remaining entries
-            if entries:
-                c.executemany('INSERT OR REPLACE INTO entries VALUES (?,?,?,?)', entries)
+        if self._index is not None:
+            result, kind = self._resolve(word, self._index.get)
+        else:
+            with self._pool.connection() as conn:
+                if self._trie is not None:
+                    # The word and every piece of its breakdown in one query
+                    rows = self._fetch_rows(self._candidate_headwords([word]), conn)
+                    result, kind = self._resolve(word, rows.get)
+                else:
+                    c = conn.cursor()
+                    query = f'SELECT {ENTRY_COLUMNS} FROM entries WHERE simplified=? OR traditional=? ORDER BY position LIMIT 1'
+                    result, kind = self._resolve(word, lambda w: c.execute(query, (w, w)).fetchone())
+        self.cache.put(word, result)
+        metrics.LOOKUP_SECONDS.observe(time.perf_counter() - start, result=kind)
+        return result
+    
+    def lookup_many(self, words):
+        """Look up several words at once, returning {word: result or None}.
+
+        Every headword the lookups could need, including the pairs and single
+        characters tried by the compound fallback, is fetched up front, so a
+        whole page costs a fixed number of queries instead of several per word."""
+        words = list(dict.fromkeys(w for w in words if w and not w.isspace()))
+        if self._index is not None:
+            return {w: self._lookup(w, self._index.get) for w in words}
         
-        print(f"Loaded {total_entries} dictionary entries")
-        conn.commit()
-        conn.close()
+        rows = self._fetch_rows(self._candidate_headwords(words))
+        return {w: self._lookup(w, rows.get) for w in words}
     
-    def _convert_pinyin(self, pinyin):
-        """Convert numbered pinyin to pinyin with tone marks"""
-        # Remove any spaces to handle each word separately
-        words = pinyin.split()
-        result = []
+    def prefetch(self, words):
+        """Warm the cache for a page so the following clicks skip the database"""
+        missing = [w for w in dict.fromkeys(words) if w not in self.cache]
+        for word, result in self.lookup_many(missing).items():
+            self.cache.put(word, result)
+    
+    def search(self, query, limit=20, offset=0):
+        """Find entries by English definition, pinyin or headword; returns (results, more).
+
+        Chinese queries match headwords exactly, then by prefix. Anything else
+        matches readings exactly (tones and spaces ignored, so 'chifan' finds
+        吃饭), then definitions by relevance ('to eat' finds 吃), then readings
+        by prefix. Each part is an indexed query cut off at the page's end."""
+        query = query.strip()
+        if not query:
+            return [], False
+        key = (query, limit, offset)
+        page = self.search_cache.get(key)
+        if page is None:
+            page = self._search(query, limit, offset)
+            self.search_cache.put(key, page)
+        return page
+
+    def _search(self, query, limit, offset):
+        wanted = offset + limit + 1
+        rows = {}
+        with self._pool.connection() as conn:
+            for sql, params in self._search_queries(query):
+                for row in conn.execute(sql, {**params, 'limit': wanted}):
+                    rows.setdefault(row[0], row[1:])
+                # Later parts rank below everything already found
+                if len(rows) >= wanted:
+                    break
+        found = list(rows.values())
+        return [self._entry(row) for row in found[offset:offset + limit]], len(found) > offset + limit
+    
+    def _search_queries(self, query):
+        """(sql, params) for each part of a search, best matches first"""
+        columns = f'rowid, {ENTRY_COLUMNS}'
+        if self._HANZI.search(query):
+            end = query[:-1] + chr(ord(query[-1]) + 1)
+            # Headwords starting with the query in either form, each read
+            # through its own index; both forms have the same length
+            prefixes = ' UNION '.join(
+                f'SELECT * FROM (SELECT {columns}, position, length(simplified) AS chars FROM entries '
+                f'WHERE {form} > :q AND {form} < :end ORDER BY {form} LIMIT {self._PREFIX_WINDOW})'
+                for form in ('simplified', 'traditional'))
+            return [
+                (f'SELECT {columns} FROM entries WHERE simplified = :q OR traditional = :q '
+                 f'ORDER BY position LIMIT :limit', {'q': query}),
+                (f'SELECT {columns} FROM ({prefixes}) ORDER BY chars, position LIMIT :limit',
+                 {'q': query, 'end': end}),
+            ]
         
+        queries = []
+        key = pinyin_marks.toneless(query)
+        if key:
+            # Proper nouns (capitalised readings) after ordinary words
+            queries.append((f'SELECT {columns} FROM entries WHERE pinyin_toneless = :key '
+                            f"ORDER BY pinyin GLOB '*[A-Z]*', position LIMIT :limit", {'key': key}))
+        words = ingest.search_words(query)
+        if words:
+            match = ingest.search_match(words)
+            # The stored order of a broad search, if it has one; when it is
+            # missing or shorter than the page, ranking every match continues
+            # it, since both break ties by position
+            queries.append((f'SELECT e.rowid, {ENTRY_COLUMNS} FROM search_ranks r JOIN entries e ON e.rowid = r.entry '
+                            f'WHERE r.match = :match ORDER BY r.rank LIMIT :limit', {'match': match}))
+            queries.append((f"""
+                SELECT e.rowid, {ENTRY_COLUMNS} FROM (
+                    SELECT rowid, rank FROM definitions_fts WHERE definitions_fts MATCH :match
+                ) AS hits JOIN entries e ON e.rowid = hits.rowid ORDER BY hits.rank, e.position LIMIT :limit""",
+                {'match': match}))
+        if key:
+            end = key[:-1] + chr(ord(key[-1]) + 1)
+            queries.append((f'SELECT {columns} FROM (SELECT {columns}, pinyin_toneless, position FROM entries '
+                            f'WHERE pinyin_toneless > :key AND pinyin_toneless < :end '
+                            f'ORDER BY pinyin_toneless LIMIT {self._PREFIX_WINDOW}) '
+                            f'ORDER BY length(pinyin_toneless), position LIMIT :limit', {'key': key, 'end': end}))
+        return queries
+    
+    def _candidate_headwords(self, words):
+        """All headwords lookup() may query while resolving the given words"""
+        headwords = set()
         for word in words:
-            # If there's no tone number, keep as is
-            if not any(c.isdigit() for c in word):
-                result.append(word)
-                continue
-                
-            # Extract tone number and remove it
-            tone = int(re.findall(r'\d', word)[0])
-            base = re.sub(r'\d', '', word)
-            
-            # Handle 'u:' or 'v' to 'ü'
-            base = base.replace('u:', 'ü').replace('v', 'ü')
-            
-            # For neutral tone (tone 5), keep the original vowel without tone mark
-            if tone == 5:
-                result.append(base)
-                continue
-            
-            # Find the vowel to modify based on priority
-            vowel_index = -1
-            vowel_to_change = 'a'
-            
-            for v in self._VOWEL_PRIORITY:
-                if v in base:
-                    vowel_index = base.index(v)
-                    vowel_to_change = v
-                    break
-            
-            if vowel_index >= 0:
-                # Handle special case for 'ü'
-                if vowel_to_change == 'ü':
-                    vowel_to_change = 'v'
-                # Get the tone marked vowel
-                tone_index = tone - 1
-                tone_vowel = self._TONE_MARKS[vowel_to_change][tone_index]
-                # Replace the vowel with tone marked version
-                if vowel_to_change == 'v':
-                    tone_vowel = tone_vowel.replace('v', 'ü')
-                base = base[:vowel_index] + tone_vowel + base[vowel_index + 1:]
-            
-            result.append(base)
+            headwords.add(word)
+            if len(word) > 1:
+                if self._trie is not None:
+                    headwords.update(piece for piece, known in self._trie.segment(word) if known)
+                else:
+                    headwords.update(word[i:i+2] for i in range(len(word) - 1))
+                    headwords.update(word)
+        return headwords
+    
+    def _fetch_rows(self, headwords, conn=None):
+        """Fetch every entry matching any of the headwords into a DictionaryIndex"""
+        if conn is None:
+            with self._pool.connection() as conn:
+                return self._fetch_rows(headwords, conn)
         
-        return ' '.join(result)
-
-    def lookup(self, word):
-        """Look up a word in the dictionary"""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        headwords = list(headwords)
+        rows = {}
+        for i in range(0, len(headwords), self._BATCH_SIZE):
+            batch = headwords[i:i + self._BATCH_SIZE]
+            marks = ','.join('?' * len(batch))
+            query = (f'SELECT position, {ENTRY_COLUMNS} FROM entries '
+                     f'WHERE simplified IN ({marks}) OR traditional IN ({marks})')
+            for row in conn.execute(query, batch + batch):
+                rows[row[0]] = row[1:]
+        # Keep file order so duplicate headwords resolve like a single lookup
+        return DictionaryIndex(rows[position] for position in sorted(rows))
+    
+    def _decompose(self, word, find):
+        """Break an unknown word into dictionary components"""
+        if self._trie is not None:
+            return [self._component(find(piece), len(piece) > 1)
+                    for piece, known in self._trie.segment(word) if known]
         
+        components = []
+        i = 0
+        while i < len(word):
+            # Try to match two characters first if possible
+            pair_match = None
+            if i + 1 < len(word):
+                pair = word[i:i+2]
+                pair_match = find(pair)
+            
+            if pair_match:
+                # If we found a two-character match, use it
+                components.append(self._component(pair_match, True))
+                i += 2
+            else:
+                # Fall back to single character
+                char_result = find(word[i])
+                if char_result:
+                    components.append(self._component(char_result, False))
+                i += 1
+        return components
+    
+    @staticmethod
+    def _entry(row):
+        """Lookup result for a (traditional, simplified, pinyin_marked, definitions) row"""
+        trad, simp, pinyin, definitions = row
+        return {
+            'traditional': trad,
+            'simplified': simp,
+            'pinyin': pinyin,
+            'definitions': definitions.split('/')
+        }
+    
+    @staticmethod
+    def _component(row, is_pair):
+        return {
+            'traditional': row[0],
+            'simplified': row[1],
+            'pinyin': row[2],
+            'definitions': row[3].split('/'),
+            'is_pair': is_pair
+        }
+    
+    def _lookup(self, word, find):
+        """Resolve a word using find(headword) -> entry row or None"""
+        return self._resolve(word, find)[0]
+    
+    def _resolve(self, word, find):
+        """Like _lookup, but returns (result, 'exact' | 'compound' | 'miss')"""
         # Try exact match first
-        c.execute('SELECT * FROM entries WHERE simplified=? OR traditional=?', (word, word))
-        result = c.fetchone()
+        result = find(word)
         
         if not result and len(word) > 1:
-            components = []
-            i = 0
-            while i < len(word):
-                # Try to match two characters first if possible
-                pair_match = None
-                if i + 1 < len(word):
-                    pair = word[i:i+2]
-                    c.execute('SELECT * FROM entries WHERE simplified=? OR traditional=?', (pair, pair))
-                    pair_match = c.fetchone()
-                
-                if pair_match:
-                    # If we found a two-character match, use it
-                    components.append({
-                        'traditional': pair_match[0],
-                        'simplified': pair_match[1],
-                        'pinyin': self._convert_pinyin(pair_match[2]),
-                        'definitions': pair_match[3].split('/'),
-                        'is_pair': True
-                    })
-                    i += 2
-                else:
-                    # Fall back to single character
-                    c.execute('SELECT * FROM entries WHERE simplified=? OR traditional=?', (word[i], word[i]))
-                    char_result = c.fetchone()
-                    if char_result:
-                        components.append({
-                            'traditional': char_result[0],
-                            'simplified': char_result[1],
-                            'pinyin': self._convert_pinyin(char_result[2]),
-                            'definitions': char_result[3].split('/'),
-                            'is_pair': False
-                        })
-                    i += 1
+            components = self._decompose(word, find)
             
             if components:
                 # Create a more descriptive combined definition
@@ -214,17 +372,8 @@ class ChineseDictionary:
                 if word != combined['simplified']:
                     combined['definitions'].append(f"Note: This is a compound word broken down into components.")
                 
-                conn.close()
-                return combined
-        
-        conn.close()
+                return combined, 'compound'
         
         if result:
-            trad, simp, pinyin, definitions = result
-            return {
-                'traditional': trad,
-                'simplified': simp,
-                'pinyin': self._convert_pinyin(pinyin),
-                'definitions': definitions.split('/')
-            }
-        return None 
\ No newline at end of file
+            return self._entry(result), 'exact'
+        return None, 'miss'
\ No newline at end of file
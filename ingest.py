@@ -0,0 +1,439 @@
+"""Bulk and incremental loading of CC-CEDICT into the dictionary database.
+
+Usage:
+    python ingest.py [cedict.txt] [--db data/dictionary.db] [--full]
+
+Without --full an existing database is updated in place, applying only the
+rows that changed since the last import.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import pinyin
+from collections import Counter
+from dataclasses import dataclass
+from itertools import combinations
+from pathlib import Path
+from typing import Iterator, Optional
+
+PROJECT_ROOT = Path(__file__).parent
+DEFAULT_CEDICT_PATH = PROJECT_ROOT / "data" / "cedict.txt"
+DEFAULT_DB_PATH = PROJECT_ROOT / "data" / "dictionary.db"
+
+# Rows inserted between progress reports
+PROGRESS_EVERY = 20000
+
+# Bulk-load settings: the database is built in a scratch file and swapped
+# in on success, so durability during the load buys nothing
+BULK_PRAGMAS = {
+    'journal_mode': 'OFF',
+    'synchronous': 'OFF',
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+    'locking_mode': 'EXCLUSIVE',
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    traditional TEXT,
+    simplified TEXT,
+    pinyin TEXT,
+    definitions TEXT,
+    pinyin_marked TEXT,
+    pinyin_toneless TEXT,
+    position INTEGER,
+    PRIMARY KEY (simplified, traditional)
+)
+'''
+
+META_SCHEMA = 'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+
+INDEXES = {
+    'idx_simplified': 'entries(simplified)',
+    'idx_traditional': 'entries(traditional)',
+    'idx_pinyin_toneless': 'entries(pinyin_toneless)',
+    'idx_position': 'entries(position)',
+}
+
+# Full-text index over the definitions for reverse (English) search. It reads
+# the text from entries, and the triggers keep it in step with updates.
+SEARCH_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS definitions_fts USING fts5(
+        definitions, content='entries', content_rowid='rowid',
+        tokenize='porter unicode61 remove_diacritics 2')''',
+    '''CREATE TRIGGER IF NOT EXISTS entries_fts_insert AFTER INSERT ON entries BEGIN
+        INSERT INTO definitions_fts (rowid, definitions) VALUES (new.rowid, new.definitions);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS entries_fts_delete AFTER DELETE ON entries BEGIN
+        INSERT INTO definitions_fts (definitions_fts, rowid, definitions) VALUES ('delete', old.rowid, old.definitions);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS entries_fts_update AFTER UPDATE OF definitions ON entries BEGIN
+        INSERT INTO definitions_fts (definitions_fts, rowid, definitions) VALUES ('delete', old.rowid, old.definitions);
+        INSERT INTO definitions_fts (rowid, definitions) VALUES (new.rowid, new.definitions);
+    END''',
+]
+
+# bm25 order of the broadest searches, precomputed because ranking costs
+# about 2 microseconds per matching definition: over 100 ms for 'to', found
+# in half the dictionary. Every set of up to RANKED_WORDS words that more
+# than BROAD_SEARCH_ENTRIES definitions contain gets its first RANKED_DEPTH
+# matches stored, including with the last word cut to each prefix of three
+# letters or more (what a reader still typing it searches for). search()
+# reads those, and only ranks every match itself past that depth.
+BROAD_SEARCH_ENTRIES = 5000
+RANKED_WORDS = 3
+RANKED_DEPTH = 1000
+RANKS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS search_ranks (
+    match TEXT,
+    rank INTEGER,
+    entry INTEGER,
+    PRIMARY KEY (match, rank)
+) WITHOUT ROWID
+'''
+
+ENTRY_COLUMNS = ('traditional', 'simplified', 'pinyin', 'definitions', 'pinyin_marked', 'pinyin_toneless', 'position')
+ROW_MARKS = ','.join('?' * len(ENTRY_COLUMNS))
+
+# Migrations for databases built by earlier versions: column -> (type, SQL to
+# backfill it). The type must match SCHEMA: a position added as TEXT sorts
+# '10' before '2'.
+DERIVED_COLUMNS = {
+    'pinyin_marked': ('TEXT', 'UPDATE entries SET pinyin_marked = mark_pinyin(pinyin)'),
+    'pinyin_toneless': ('TEXT', 'UPDATE entries SET pinyin_toneless = toneless_pinyin(pinyin)'),
+    # Rowids were the file order for databases built before positions were stored
+    'position': ('INTEGER', 'UPDATE entries SET position = rowid'),
+}
+
+@dataclass
+class IngestStats:
+    rows: int = 0       # Entries parsed from the file
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+def parse_line(line: str) -> Optional[tuple]:
+    """Parse one CC-CEDICT line into (traditional, simplified, pinyin, definitions).
+
+    Line format: traditional simplified [pinyin] /definition 1/definition 2/
+    Returns None for comments and malformed lines."""
+    if line.startswith('#'):
+        return None
+    line = line.strip()
+    parts = line.split(None, 2)
+    if len(parts) < 3 or not line.endswith('/'):
+        return None
+    trad, simp, rest = parts
+    close = rest.find(']')
+    if not rest.startswith('[') or close < 0:
+        return None
+    defs = rest[close + 1:].lstrip()
+    if len(defs) < 3 or defs[0] != '/':
+        return None
+    return trad, simp, rest[1:close], defs[1:-1]
+
+def iter_entries(cedict_path) -> Iterator[tuple]:
+    """Stream parsed entries from a CC-CEDICT file"""
+    with open(cedict_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = parse_line(line)
+            if entry:
+                yield entry
+
+def to_row(trad: str, simp: str, numbered: str, defs: str, position: int) -> tuple:
+    """Database row for a parsed entry, in ENTRY_COLUMNS order.
+
+    `position` is the entry's index in the file. When entries share a
+    headword, lookups return the one with the lowest position, so build()
+    and update() must both give a duplicated key its last occurrence's."""
+    return trad, simp, numbered, defs, pinyin.convert(numbered), pinyin.toneless(numbered), position
+
+def file_digest(path) -> str:
+    """SHA-256 of a file, used to recognise an already imported CC-CEDICT release"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def print_progress(rows: int, elapsed: float) -> None:
+    print(f"  {rows} entries ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+def _apply_pragmas(conn, pragmas: dict) -> None:
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name}={value}')
+
+def create_schema(conn) -> None:
+    """Create the entries and meta tables"""
+    conn.execute(SCHEMA)
+    conn.execute(META_SCHEMA)
+
+def create_indexes(conn) -> None:
+    """Create the secondary indexes on entries"""
+    for name, target in INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+def create_search_index(conn) -> None:
+    """Create the definitions full-text index and fill it from entries"""
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO definitions_fts (definitions_fts) VALUES ('rebuild')")
+
+def search_words(query: str) -> list:
+    """Lowercased words of an English search query"""
+    return re.findall(r'\w+', query.lower())
+
+def search_match(words: list) -> str:
+    """FTS5 MATCH expression for a search's words.
+
+    Each word is quoted so user input is never parsed as FTS syntax. A last
+    word of three or more letters is also a prefix, so partially typed
+    queries already match; shorter ones would expand to most terms. Every
+    word must match and bm25 adds up their scores, so the words before the
+    last are sorted, giving each search one expression."""
+    *rest, last = words
+    return ' '.join(f'"{w}"' for w in sorted(rest) + [last]) + ('*' if len(last) >= 3 else '')
+
+def _broad_searches(conn) -> set:
+    """MATCH expressions of the searches found in over BROAD_SEARCH_ENTRIES definitions"""
+    definitions = lambda: (set(search_words(text)) for (text,) in conn.execute('SELECT definitions FROM entries'))
+    counts = Counter(word for words in definitions() for word in words)
+    broad = {word for word, entries in counts.items() if entries > BROAD_SEARCH_ENTRIES}
+    # A set of words is only this broad if each of its words is
+    counts = Counter()
+    for words in definitions():
+        present = sorted(words & broad)
+        for size in range(1, min(len(present), RANKED_WORDS) + 1):
+            counts.update(combinations(present, size))
+    matches = set()
+    for words, entries in counts.items():
+        if entries > BROAD_SEARCH_ENTRIES:
+            for last in words:
+                rest = [w for w in words if w != last]
+                prefixes = [last[:i] for i in range(3, len(last) + 1)] or [last]
+                matches.update(search_match(rest + [prefix]) for prefix in prefixes)
+    return matches
+
+def rank_broad_searches(conn) -> int:
+    """Store the bm25 order of the broadest searches; returns how many"""
+    matches = _broad_searches(conn)
+    conn.execute(RANKS_SCHEMA)
+    conn.execute('DELETE FROM search_ranks')
+    for match in matches:
+        # Ties go to the earlier entry in the file, as in search(), so both
+        # give the same order (and build() and update() store the same one)
+        rows = conn.execute('SELECT hits.rowid FROM (SELECT rowid, rank FROM definitions_fts WHERE definitions_fts MATCH ?) '
+                            'AS hits JOIN entries e ON e.rowid = hits.rowid ORDER BY hits.rank, e.position LIMIT ?',
+                            (match, RANKED_DEPTH)).fetchall()
+        conn.executemany('INSERT INTO search_ranks VALUES (?, ?, ?)',
+                         ((match, rank, rowid) for rank, (rowid,) in enumerate(rows)))
+    return len(matches)
+
+def _retype_column(conn, column: str, column_type: str) -> None:
+    """Give a column an earlier migrate() added as TEXT its declared type.
+
+    SQLite cannot change a column's type, so the values move to a new column.
+    Indexes on the old one block dropping it; create_indexes() remakes them."""
+    for name, target in INDEXES.items():
+        if target.endswith(f'({column})'):
+            conn.execute(f'DROP INDEX IF EXISTS {name}')
+    conn.execute(f'ALTER TABLE entries RENAME COLUMN {column} TO {column}_old')
+    conn.execute(f'ALTER TABLE entries ADD COLUMN {column} {column_type}')
+    conn.execute(f'UPDATE entries SET {column} = CAST({column}_old AS {column_type})')
+    conn.execute(f'ALTER TABLE entries DROP COLUMN {column}_old')
+
+def migrate(db_path) -> None:
+    """Bring a database built by an earlier version up to the current schema.
+
+    Adds and backfills derived columns, the search index and any missing
+    indexes, once."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        columns = {row[1]: row[2].upper() for row in conn.execute('PRAGMA table_info(entries)')}
+        missing = [c for c in DERIVED_COLUMNS if c not in columns]
+        mistyped = [c for c in DERIVED_COLUMNS if c in columns and columns[c] != DERIVED_COLUMNS[c][0]]
+        conn.create_function('mark_pinyin', 1, pinyin.convert, deterministic=True)
+        conn.create_function('toneless_pinyin', 1, pinyin.toneless, deterministic=True)
+        has_search = conn.execute("SELECT 1 FROM sqlite_master WHERE name='definitions_fts'").fetchone()
+        has_ranks = conn.execute("SELECT 1 FROM sqlite_master WHERE name='search_ranks'").fetchone()
+        conn.execute('BEGIN IMMEDIATE')
+        for column in missing:
+            print(f"Migrating dictionary database: adding {column}")
+            column_type, backfill = DERIVED_COLUMNS[column]
+            conn.execute(f'ALTER TABLE entries ADD COLUMN {column} {column_type}')
+            conn.execute(backfill)
+        for column in mistyped:
+            print(f"Migrating dictionary database: converting {column} to {DERIVED_COLUMNS[column][0]}")
+            _retype_column(conn, column, DERIVED_COLUMNS[column][0])
+        if not has_search:
+            print("Migrating dictionary database: building the definitions search index")
+            create_search_index(conn)
+        if not has_ranks:
+            print("Migrating dictionary database: ranking the broadest searches")
+            rank_broad_searches(conn)
+        conn.execute(META_SCHEMA)
+        create_indexes(conn)
+        conn.execute('COMMIT')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def _set_meta(conn, **values) -> None:
+    conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                     [(k, str(v)) for k, v in values.items()])
+
+def loaded_digest(db_path) -> Optional[str]:
+    """Digest of the CC-CEDICT file the database was last loaded from"""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key='cedict_sha256'").fetchone()
+        return row[0] if row else None
+    except sqlite3.OperationalError:
+        # Databases built before the meta table existed
+        return None
+    finally:
+        conn.close()
+
+def _with_progress(entries, stats: IngestStats, start: float, progress):
+    for entry in entries:
+        stats.rows += 1
+        if progress and stats.rows % PROGRESS_EVERY == 0:
+            progress(stats.rows, time.perf_counter() - start)
+        yield entry
+
+def build(db_path=DEFAULT_DB_PATH, cedict_path=DEFAULT_CEDICT_PATH, progress=print_progress) -> IngestStats:
+    """Build a fresh dictionary database from a CC-CEDICT file.
+
+    The file is streamed into a scratch database in a single transaction,
+    indexes are created once the data is in, and the result atomically
+    replaces db_path."""
+    db_path, cedict_path = Path(db_path), Path(cedict_path)
+    if not cedict_path.exists():
+        raise FileNotFoundError(f"CC-CEDICT file not found at {cedict_path}. Please ensure cedict.txt is in the data directory.")
+
+    print(f"Loading dictionary data from {cedict_path}")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(db_path.name + '.tmp')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    stats = IngestStats()
+    start = time.perf_counter()
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        _apply_pragmas(conn, BULK_PRAGMAS)
+        conn.execute('BEGIN')
+        create_schema(conn)
+        # Later duplicates of a (simplified, traditional) pair win, as before
+        conn.executemany(f'INSERT OR REPLACE INTO entries ({", ".join(ENTRY_COLUMNS)}) VALUES ({ROW_MARKS})',
+                         (to_row(*entry, position) for position, entry
+                          in enumerate(_with_progress(iter_entries(cedict_path), stats, start, progress))))
+        create_indexes(conn)
+        create_search_index(conn)
+        rank_broad_searches(conn)
+        _set_meta(conn, cedict_sha256=file_digest(cedict_path), cedict_entries=stats.rows, loaded_at=time.time())
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+    except BaseException:
+        conn.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    conn.close()
+    os.replace(tmp_path, db_path)
+
+    stats.inserted = stats.rows
+    stats.seconds = time.perf_counter() - start
+    print(f"Loaded {stats.rows} dictionary entries in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s)")
+    return stats
+
+def update(db_path=DEFAULT_DB_PATH, cedict_path=DEFAULT_CEDICT_PATH, progress=print_progress) -> IngestStats:
+    """Bring an existing database in line with a newer CC-CEDICT file.
+
+    The new file is diffed against the loaded rows by (simplified, traditional)
+    key and only inserts, changes and removals are written, all in one
+    transaction. Unchanged files are detected by digest and skipped."""
+    db_path, cedict_path = Path(db_path), Path(cedict_path)
+    if not db_path.exists():
+        return build(db_path, cedict_path, progress)
+
+    stats = IngestStats()
+    start = time.perf_counter()
+    digest = file_digest(cedict_path)
+    if digest == loaded_digest(db_path):
+        print(f"Dictionary database is already up to date with {cedict_path}")
+        return stats
+
+    print(f"Updating dictionary data from {cedict_path}")
+    new, positions = {}, {}
+    for position, (trad, simp, pinyin, defs) in enumerate(_with_progress(iter_entries(cedict_path), stats, start, progress)):
+        new[(simp, trad)] = (pinyin, defs)
+        positions[(simp, trad)] = position
+
+    migrate(db_path)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA cache_size=-64000')
+        conn.execute('BEGIN IMMEDIATE')
+        old, old_positions = {}, {}
+        for simp, trad, pinyin, defs, position in conn.execute(
+                'SELECT simplified, traditional, pinyin, definitions, position FROM entries'):
+            old[(simp, trad)] = (pinyin, defs)
+            old_positions[(simp, trad)] = position
+
+        removed = [key for key in old if key not in new]
+        added = [to_row(trad, simp, *new[(simp, trad)], positions[(simp, trad)])
+                 for simp, trad in new if (simp, trad) not in old]
+        changed = [to_row(trad, simp, *new[(simp, trad)], positions[(simp, trad)])[2:6] + (simp, trad)
+                   for simp, trad in new if (simp, trad) in old and old[(simp, trad)] != new[(simp, trad)]]
+        # Lines inserted or removed above an entry move it without changing it;
+        # only the position column is rewritten for those
+        moved = [(positions[key], *key) for key in new if key in old and old_positions[key] != positions[key]]
+
+        conn.executemany('DELETE FROM entries WHERE simplified=? AND traditional=?', removed)
+        conn.executemany(f'INSERT INTO entries ({", ".join(ENTRY_COLUMNS)}) VALUES ({ROW_MARKS})', added)
+        conn.executemany('UPDATE entries SET pinyin=?, definitions=?, pinyin_marked=?, pinyin_toneless=? '
+                         'WHERE simplified=? AND traditional=?', changed)
+        conn.executemany('UPDATE entries SET position=? WHERE simplified=? AND traditional=?', moved)
+        create_indexes(conn)
+        # Any change to the definitions can reorder (or add) the broad searches
+        if added or changed or removed:
+            rank_broad_searches(conn)
+        _set_meta(conn, cedict_sha256=digest, cedict_entries=stats.rows, loaded_at=time.time())
+        conn.execute('COMMIT')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    stats.inserted, stats.updated, stats.deleted = len(added), len(changed), len(removed)
+    stats.seconds = time.perf_counter() - start
+    print(f"Applied {stats.inserted} inserts, {stats.updated} updates and {stats.deleted} deletions "
+          f"from {stats.rows} entries in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s)")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Load CC-CEDICT into the dictionary database")
+    parser.add_argument('cedict', nargs='?', default=DEFAULT_CEDICT_PATH, help="path to cedict.txt")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="dictionary database to build or update")
+    parser.add_argument('--full', action='store_true', help="rebuild from scratch instead of applying changes")
+    args = parser.parse_args()
+    if args.full:
+        build(args.db, args.cedict)
+    else:
+        update(args.db, args.cedict)
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,134 @@
 from fasthtml.common import *
-import jieba
 from dictionary import ChineseDictionary
 import math
+import os
+import threading
 from pathlib import Path
 import time
 from dataclasses import dataclass
 from typing import List, Optional
+from urllib.parse import urlencode
 import saved_words
-from db import is_word_saved
+from cache import LRUCache
+import metrics
+from db import create_tables, is_word_saved, saved_words_among, saved_words_version, connections as db_connections
+from db.connections import WalCheckpointer
+from services.documents import Document, content_digest, create_store
+from services.library import DocumentLibrary
+from services import blocking, review, segmentation
+from services.blocking import offload
+from services.sessions import session_id
+from startup import Startup, prewarm_jieba
 
 app,rt = fast_app()
+# Request latency, per-stage timings and query counts, exported at /metrics
+app.add_middleware(metrics.MetricsMiddleware, routes=lambda: app.routes)
+app.after.append(metrics.mark_handled)
 
-text_content = ""
-segmented_words = []
-dictionary = ChineseDictionary()
+# Dictionary database (defaults to data/dictionary.db, built on first run)
+DICTIONARY_DB = os.environ.get('DICTIONARY_DB') or None
+# 'memory' loads the whole dictionary into RAM so lookups never touch disk
+DICTIONARY_ENGINE = os.environ.get('DICTIONARY_ENGINE', 'sqlite')
+# 'trie' breaks unknown compounds into headwords of any length
+DICTIONARY_DECOMPOSITION = os.environ.get('DICTIONARY_DECOMPOSITION', 'greedy')
 WORDS_PER_PAGE = 200
-current_page = 0
+# Results per page of dictionary search
+SEARCH_PAGE_SIZE = 20
+
+# Each browser session gets its own document; 'sqlite' shares them across
+# worker processes and restarts
+DOCUMENT_STORE = os.environ.get('DOCUMENT_STORE', 'memory')
+# Every segmented text, stored once per content hash with its token boundaries
+LIBRARY_DB = os.environ.get('LIBRARY_DB', 'data/library.db')
+# Library retention: total size of the stored texts, and days a text stays in
+# a session's library without being opened (0 disables either)
+LIBRARY_MAX_MB = int(os.environ.get('LIBRARY_MAX_MB', '1024'))
+LIBRARY_MAX_AGE_DAYS = float(os.environ.get('LIBRARY_MAX_AGE_DAYS', '180'))
+# Flashcard review sessions; 'sqlite' keeps them across restarts and workers
+REVIEW_STORE = os.environ.get('REVIEW_STORE', 'memory')
+# 'batch' sends a review's cards up front and posts answers in batches
+# instead of one round trip per card
+REVIEW_ANSWERS = os.environ.get('REVIEW_ANSWERS', 'each')
+# Segmentations still running in the background, by session id. Replacing
+# a session's job and writing its finished document happen under the lock,
+# so a job that has been replaced never saves over the newer document
+segmentations = {}
+segmentation_lock = threading.RLock()
+# Worker processes for background segmentation (0 = in-process, where jieba
+# holds the GIL and slows every other request while it runs)
+SEGMENT_PROCESSES = int(os.environ.get('SEGMENT_PROCESSES', '1'))
+# 'startup' loads jieba's model before serving, 'background' loads it while
+# serving (/ready reports 503 until done), 'off' leaves it to the first submission
+JIEBA_PREWARM = os.environ.get('JIEBA_PREWARM', 'startup')
+# 'compact' renders each word as a bare span and handles clicks with one
+# delegated handler on the page, instead of a card with its own hx attributes
+READER_MARKUP = os.environ.get('READER_MARKUP', 'cards')
+# Where jieba keeps its built model cache (defaults to the system temp directory)
+JIEBA_CACHE_DIR = os.environ.get('JIEBA_CACHE_DIR') or None
+
+# Threads for blocking dictionary, database and segmentation work, so the
+# event loop itself never waits on SQLite or jieba
+BLOCKING_WORKERS = int(os.environ.get('BLOCKING_WORKERS', '16'))
+# Seconds between background wal_checkpoint(TRUNCATE) runs (0 disables)
+WAL_CHECKPOINT_INTERVAL = float(os.environ.get('WAL_CHECKPOINT_INTERVAL', '300'))
+
+# Shared services, created once by start() in the serving process
+startup = Startup()
+dictionary: ChineseDictionary = None
+documents = None
+library: DocumentLibrary = None
+checkpointer: WalCheckpointer = None
+
+def start():
+    """Run the startup phases in order, timing each one"""
+    global dictionary, documents, library, checkpointer
+    blocking.configure(BLOCKING_WORKERS)
+    with startup.phase('saved_words_db'):
+        create_tables()
+    with startup.phase('dictionary'):
+        dictionary = ChineseDictionary(DICTIONARY_DB, engine=DICTIONARY_ENGINE, decomposition=DICTIONARY_DECOMPOSITION)
+    with startup.phase('document_library'):
+        library = DocumentLibrary(LIBRARY_DB, max_bytes=LIBRARY_MAX_MB * 1024 * 1024,
+                                  max_age=LIBRARY_MAX_AGE_DAYS * 24 * 3600)
+    with startup.phase('document_store'):
+        documents = create_store(DOCUMENT_STORE, library)
+        # Once the store can report which texts its sessions are reading
+        library.prune()
+    with startup.phase('review_store'):
+        review.configure_store(REVIEW_STORE)
+    with startup.phase('wal_checkpoint'):
+        databases = [db_connections.path, library.connections.path] + (
+            [documents.connections.path] if DOCUMENT_STORE == 'sqlite' else [])
+        checkpointer = WalCheckpointer(databases, WAL_CHECKPOINT_INTERVAL)
+        # Start from an empty log, then keep it that way in the background
+        checkpointer.run_once()
+        checkpointer.start()
+    if JIEBA_PREWARM == 'background':
+        startup.in_background('jieba', lambda: prewarm_jieba(JIEBA_CACHE_DIR))
+    elif JIEBA_PREWARM != 'off':
+        with startup.phase('jieba'):
+            prewarm_jieba(JIEBA_CACHE_DIR)
+    if SEGMENT_PROCESSES > 0:
+        # Forks after jieba is loaded so the workers inherit its model
+        with startup.phase('segment_processes'):
+            segmentation.configure_processes(SEGMENT_PROCESSES)
+    startup.finish()
+
+# Runs in the server process only, so `python main.py` (which imports this
+# module twice) still builds the dictionary once
+app.add_event_handler('startup', start)
+
+# Rendered definition card markup keyed by (word, is_saved), plus each word's
+# saved state so repeat clicks skip the is_word_saved query
+definition_cards = LRUCache(max_entries=5000, max_bytes=16 * 1024 * 1024, sizeof=len)
+saved_state = LRUCache(max_entries=20000, max_bytes=4 * 1024 * 1024)
+# Rendered word markup keyed by (document digest, page, tokens on the page,
+# saved_words_version()); the version retires fragments and ETags whenever
+# any worker saves or removes a word
+page_fragments = LRUCache(max_entries=2000, max_bytes=32 * 1024 * 1024, sizeof=len)
+# Handlers run on several threads, so the counter changes under the lock
+not_modified_responses = 0
+_counter_lock = threading.Lock()
 
 def mk_textarea():
     return Div(
@@ -33,80 +146,243 @@ def mk_textarea():
         id="input-area",
     )
 
-def mk_word_span(word):
+def mk_word_span(word, saved: bool = False):
     return Card(
         word,
-        cls="chinese-word",
+        cls="chinese-word saved" if saved else "chinese-word",
         hx_post=f"/lookup/{word}",
         hx_target="#definition-card",
         hx_swap="outerHTML",
         hx_indicator="#loading"
     )
 
+WORDS_STYLE = "line-height: 2; display: flex; flex-wrap: wrap; gap: 4px; align-items: center;"
+
+# One click handler for every word on a compact page: fires only for clicks on
+# a word span and rewrites the request path to that word's lookup
+WORD_CLICK_HANDLER = {
+    'hx-post': '/lookup',
+    'hx-trigger': "click[target.parentElement === this]",
+    'hx-target': '#definition-card',
+    'hx-swap': 'outerHTML',
+    'hx-indicator': '#loading',
+    'hx-on::config-request': "event.detail.path = '/lookup/' + encodeURIComponent(event.detail.triggeringEvent.target.textContent)",
+}
+
+def mk_words(page_words, saved=frozenset(), markup: str = None):
+    """A page's words in the configured markup, with saved words highlighted"""
+    if (markup or READER_MARKUP) == 'compact':
+        spans = [Span(word, cls="saved") if word in saved else Span(word) for word in page_words]
+        return P(*spans, cls="compact-words", style=WORDS_STYLE, **WORD_CLICK_HANDLER)
+    return P(*[mk_word_span(word, word in saved) for word in page_words], style=WORDS_STYLE)
+
+def page_tokens(page: int, segmented_words) -> int:
+    """Tokens segmented so far on a page; a page still being segmented has fewer"""
+    return max(0, min(len(segmented_words), (page + 1) * WORDS_PER_PAGE) - page * WORDS_PER_PAGE)
+
+def mk_page_words(document: Document, page: int, segmented_words, version: int):
+    """The page's clickable words, rendered once per document, page, its tokens
+    so far and saved words version"""
+    key = (document.digest, page, page_tokens(page, segmented_words), version)
+    html = page_fragments.get(key)
+    if html is None:
+        page_words = segmented_words[page * WORDS_PER_PAGE:(page + 1) * WORDS_PER_PAGE]
+        # Resolve the whole page in one batch so word clicks are served from memory
+        dictionary.prefetch(page_words)
+        # One query for the page's saved words, which also answers later clicks
+        saved = saved_words_among(page_words)
+        for word in set(page_words):
+            saved_state.put(word, word in saved)
+        with metrics.RENDER_SECONDS.time(part='page_fragment'):
+            html = to_xml(mk_words(page_words, saved), indent=False)
+        page_fragments.put(key, html)
+    return NotStr(html)
+
+def page_etag(view: str, document: Document, page: int, segmented_words, complete: bool, version: int) -> str:
+    """ETag for a rendered page; changes with the document, the page's tokens,
+    the page count and saved words"""
+    total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE)
+    return (f'"{document.digest}-{view}-{page}-{page_tokens(page, segmented_words)}-'
+            f'{total_pages}{"" if complete else "+"}-{version}"')
+
+def cached_response(request, etag: str, render):
+    """304 when the client already holds this ETag, otherwise render() tagged with it"""
+    global not_modified_responses
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag in request.headers.get('if-none-match', ''):
+        with _counter_lock:
+            not_modified_responses += 1
+        return Response(status_code=304, headers=headers)
+    return FtResponse(render(), headers=headers)
+
+def get_document(session) -> Document:
+    """The session's current document, or an empty one"""
+    return documents.get(session_id(session)) or Document()
+
+def get_words(session, upto: int, document: Document = None):
+    """(words, complete) for the session, waiting until `upto` tokens are segmented.
+
+    Pass the session's document if it has already been loaded."""
+    sid = session_id(session)
+    job = segmentations.get(sid)
+    if job is None:
+        if document is None:
+            document = get_document(session)
+        if document.complete:
+            return document.words, True
+        job = resume_segmentation(sid)
+        if job is None:
+            # Finished between the two checks
+            document = get_document(session)
+            return document.words, document.complete
+    job.wait_for(upto)
+    return job.words, job.done
+
+def mk_page_info(page: int, total_pages: int, complete: bool):
+    """Page counter; while segmentation is running it polls for the updated count"""
+    if complete:
+        return Span(f"Page {page + 1} of {total_pages}", cls="page-info")
+    return Span(
+        f"Page {page + 1} of {total_pages}+",
+        cls="page-info",
+        hx_get=f"/pagination/{page}",
+        hx_trigger="every 1s",
+        hx_target="#pagination-controls",
+        hx_swap="outerHTML"
+    )
+
+def mk_pagination(page: int, segmented_words, complete: bool):
+    total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE)
+    has_next = page < total_pages - 1 or not complete
+    return Div(
+        Button("←", disabled=page==0, hx_get=f"/page/{page-1}", hx_target="#result-container") if page > 0 else None,
+        mk_page_info(page, total_pages, complete),
+        Button("→", hx_get=f"/page/{page+1}", hx_target="#result-container") if has_next else None,
+        id="pagination-controls",
+        cls="pagination-controls"
+    )
+
 @rt('/')
-def get():
-    # Only reset state if there's no existing text content
-    # This preserves the state when navigating back
-    global text_content, segmented_words, current_page
+@offload
+def get(request, session):
+    # State lives in the session's document, which is preserved when
+    # navigating back and empty until the first submission
+    document = get_document(session)
+    text_content = document.text
+    current_page = document.current_page if text_content else 0
+    segmented_words, complete = get_words(session, (current_page + 1) * WORDS_PER_PAGE, document)
     if not text_content:
-        segmented_words = []
-        current_page = 0
-    
-    # Calculate pagination info if we have content
-    total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE) if segmented_words else 0
-    start_idx = current_page * WORDS_PER_PAGE
-    end_idx = start_idx + WORDS_PER_PAGE
-    page_words = segmented_words[start_idx:end_idx] if segmented_words else []
+        segmented_words, complete = [], True
     
-    return Title("Chinese Reader"), Container(
-        Link(href="/static/styles.css", rel="stylesheet"),
-        Div(
-            Form(
-                Textarea(
-                    placeholder="Paste your Chinese text here...",
-                    name="content",
-                    id="content-input"
+    version = saved_words_version()
+
+    # Built only when the client's copy is out of date
+    def render():
+        # Calculate pagination info if we have content
+        total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE) if segmented_words else 0
+        return Title("Chinese Reader"), Container(
+            Link(href="/static/styles.css", rel="stylesheet"),
+            Div(
+                Form(
+                    Textarea(
+                        placeholder="Paste your Chinese text here...",
+                        name="content",
+                        id="content-input"
+                    ),
+                    Button("Submit", type="submit"),
+                    hx_post="/",
+                    hx_target="#result",
+                    id="input-form"
+                ) if not text_content else Button(
+                    "Add New Text",
+                    id="add-text-btn",
+                    hx_post="/show-input",
+                    hx_target="#input-area",
+                    hx_swap="innerHTML"
                 ),
-                Button("Submit", type="submit"),
-                hx_post="/",
-                hx_target="#result",
-                id="input-form"
-            ) if not text_content else Button(
-                "Add New Text",
-                id="add-text-btn",
-                hx_post="/show-input",
-                hx_target="#input-area",
-                hx_swap="innerHTML"
+                id="input-area"
             ),
-            id="input-area"
-        ),
-        Div(
             Div(
-                # Show segmented text if available, otherwise show message
-                P(
-                    *[mk_word_span(word) for word in page_words],
-                    style="line-height: 2; display: flex; flex-wrap: wrap; gap: 4px; align-items: center;"
-                ) if text_content and segmented_words else P("No text submitted yet."),
-                id="result"
+                Div(
+                    # Show segmented text if available, otherwise show message
+                    mk_page_words(document, current_page, segmented_words, version) if text_content and segmented_words else P("No text submitted yet."),
+                    id="result"
+                ),
+                Div(
+                    # Show pagination if we have segmented text with multiple pages
+                    Button("←", disabled=current_page==0, hx_get=f"/page/{current_page-1}", hx_target="#result-container") if current_page > 0 else Button("←", disabled=True),
+                    mk_page_info(current_page, total_pages, complete),
+                    Button("→", hx_get=f"/page/{current_page+1}", hx_target="#result-container") if current_page < total_pages-1 or not complete else Button("→", disabled=True),
+                    id="pagination-controls",
+                    cls="pagination-controls"
+                ) if segmented_words else Div(id="pagination-controls", cls="pagination-controls"),
+                id="result-container"
             ),
-            Div(
-                # Show pagination if we have segmented text with multiple pages
-                Button("←", disabled=current_page==0, hx_post=f"/page/{current_page-1}", hx_target="#result-container") if current_page > 0 else Button("←", disabled=True),
-                Span(f"Page {current_page + 1} of {total_pages}", cls="page-info"),
-                Button("→", disabled=current_page>=total_pages-1, hx_post=f"/page/{current_page+1}", hx_target="#result-container") if current_page < total_pages-1 else Button("→", disabled=True),
-                id="pagination-controls",
-                cls="pagination-controls"
-            ) if segmented_words else Div(id="pagination-controls", cls="pagination-controls"),
-            id="result-container"
-        ),
-        Card(
-            Div(id="definition"),
-            id="definition-card",
-            style="display: none;"
+            Card(
+                Div(id="definition"),
+                id="definition-card",
+                style="display: none;"
+            ),
+            mk_search(),
+            A("View Saved Words →", href="/saved-words", id="view-saved-words"),
+            A("Library →", href="/library", id="view-library")
+        )
+    if not text_content:
+        return render()
+    # Full pages and htmx boosts render differently, so they get different tags
+    view = 'index-hx' if request.headers.get('HX-Request') else 'index'
+    return cached_response(request, page_etag(view, document, current_page, segmented_words, complete, version), render)
+
+def mk_search():
+    """Dictionary search box; results load below it as the reader types"""
+    return Div(
+        Input(
+            type="search",
+            name="q",
+            placeholder="Search the dictionary: English, pinyin or 汉字",
+            aria_label="Search the dictionary",
+            hx_get="/search",
+            hx_trigger="input changed delay:300ms, search",
+            hx_target="#search-results",
         ),
-        A("View Saved Words →", href="/saved-words", id="view-saved-words")
+        Div(id="search-results"),
+        id="dictionary-search"
     )
 
+def mk_search_results(q: str, page: int):
+    """One page of search results, ending in a button that loads the next"""
+    results, more = dictionary.search(q, limit=SEARCH_PAGE_SIZE, offset=page * SEARCH_PAGE_SIZE)
+    if not results:
+        return P("No matches.", cls="search-empty") if q.strip() and page == 0 else ()
+    items = [
+        Div(
+            Span(r['simplified'], cls="search-hanzi"),
+            Span(f"[{r['pinyin']}]", cls="search-pinyin"),
+            Span('; '.join(d for d in r['definitions'] if d), cls="search-definitions"),
+            cls="search-result",
+            hx_post=f"/lookup/{r['simplified']}",
+            hx_target="#definition-card",
+            hx_swap="outerHTML",
+            hx_indicator="#loading"
+        )
+        for r in results
+    ]
+    if more:
+        items.append(Button(
+            "More results",
+            hx_get=f"/search?{urlencode({'q': q, 'page': page + 1})}",
+            hx_target="this",
+            hx_swap="outerHTML",
+            cls="secondary search-more"
+        ))
+    return tuple(items)
+
+@rt('/search')
+@offload
+def get(q: str = '', page: int = 0):
+    """Reverse dictionary search by English, toneless pinyin or headword"""
+    return mk_search_results(q, max(page, 0))
+
 @rt('/show-input')
 def post():
     return Form(
@@ -122,39 +398,117 @@ def post():
     )
 
 @rt('/page/{page}')
-def get_page(page: int):
-    global current_page
-    current_page = page
-    total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE)
-    start_idx = page * WORDS_PER_PAGE
-    end_idx = start_idx + WORDS_PER_PAGE
-    page_words = segmented_words[start_idx:end_idx]
-    
-    word_spans = [mk_word_span(word) for word in page_words]
+@offload
+def get_page(page: int, request, session):
+    # Only waits for background segmentation to reach the end of this page
+    document = get_document(session)
+    segmented_words, complete = get_words(session, (page + 1) * WORDS_PER_PAGE, document)
+    documents.set_page(session_id(session), page)
+    version = saved_words_version()
+    etag = page_etag('page', document, page, segmented_words, complete, version)
     
-    return Div(
+    return cached_response(request, etag, lambda: Div(
         Div(
-            P(*word_spans, style="line-height: 2; display: flex; flex-wrap: wrap; gap: 4px; align-items: center;"),
+            mk_page_words(document, page, segmented_words, version),
             id="result"
         ),
-        Div(
-            Button("←", disabled=page==0, hx_post=f"/page/{page-1}", hx_target="#result-container") if page > 0 else None,
-            Span(f"Page {page + 1} of {math.ceil(len(segmented_words) / WORDS_PER_PAGE)}", cls="page-info"),
-            Button("→", disabled=page>=math.ceil(len(segmented_words) / WORDS_PER_PAGE)-1, hx_post=f"/page/{page+1}", hx_target="#result-container") if page < math.ceil(len(segmented_words) / WORDS_PER_PAGE)-1 else None,
-            id="pagination-controls",
-            cls="pagination-controls"
-        ),
+        mk_pagination(page, segmented_words, complete),
         id="result-container"
-    )
+    ))
+
+@rt('/pagination/{page}')
+@offload
+def get(page: int, session):
+    """Pagination controls, polled while the rest of the text is segmented"""
+    segmented_words, complete = get_words(session, 0)
+    return mk_pagination(page, segmented_words, complete)
 
 @rt('/')
-async def post(request):
+async def post(request, session):
     form = await request.form()
-    global text_content, segmented_words, current_page
-    text_content = form.get('content', '').strip()
+    # Segmenting and saving the document block, so they run off the event loop
+    return await blocking.executor.run(submit_text, session, form.get('content', '').strip())
+
+def cancel_segmentation(sid: str):
+    """Stop segmenting the session's previous document, if that is still running"""
+    with segmentation_lock:
+        previous = segmentations.pop(sid, None)
+    if previous is not None:
+        previous.cancel()
+
+def replace_document(sid: str, document: Document):
+    """Make document the session's current one, cancelling any segmentation in progress"""
+    with segmentation_lock:
+        cancel_segmentation(sid)
+        documents.save(sid, document)
+
+def start_document(sid: str, text: str):
+    """(document, complete) for a new submission: rebuilt from the library, or
+    its first page segmented now and the rest in the background"""
+    # A text that was segmented before is rebuilt from the library instead
+    stored = library.open(content_digest(text))
+    if stored is not None and library.link(sid, stored.digest):
+        replace_document(sid, stored)
+        return stored, True
+
+    document = Document(text=text, complete=False)
+    with segmentation_lock:
+        # Held through the first page so the incomplete document is saved
+        # before on_complete can save the finished one
+        job = segment_document(sid, document)
+        if not document.complete:
+            documents.save(sid, document)
+    return document, job.done
+
+def segment_document(sid: str, document: Document) -> segmentation.SegmentationJob:
+    """Start segmenting document as the session's current one, replacing
+    whatever is still being segmented. Call with segmentation_lock held."""
+
+    def on_complete(job):
+        document.complete = True
+        library.add(document, sid)
+        with segmentation_lock:
+            # Only the session's current job may write its document
+            if segmentations.get(sid) is not job:
+                return
+            del segmentations[sid]
+            # Keep any page the reader moved to while segmentation was running.
+            # A short text completes inside start(), while the store still
+            # holds the previous document, whose page does not apply.
+            stored = documents.get(sid)
+            if stored is not None and stored.digest == document.digest:
+                document.current_page = stored.current_page
+            documents.save(sid, document)
+
+    cancel_segmentation(sid)
+    # Registered before it starts, so on_complete always finds it
+    job = segmentations[sid] = segmentation.SegmentationJob(document.text)
+    document.words = job.words
+    job.start(WORDS_PER_PAGE, on_complete)
+    return job
+
+def resume_segmentation(sid: str):
+    """Segment the session's stored document again if it is incomplete with no
+    job in this process (the server restarted, or another worker started it).
+
+    Returns the job, or None if the document is complete or missing."""
+    with segmentation_lock:
+        job = segmentations.get(sid)
+        if job is not None:
+            return job
+        document = documents.get(sid)
+        if document is None or document.complete:
+            return None
+        print(f"Resuming segmentation of document {document.digest[:12]}")
+        return segment_document(sid, document)
+
+def submit_text(session, text_content: str):
+    """Start segmenting a submission (or reopen it from the library) and render its first page"""
+    sid = session_id(session)
     
     # Return early if no text is provided
     if not text_content:
+        replace_document(sid, Document())
         return (
             Div(
                 P("Please enter some text to segment.", style="color: var(--pico-muted-color);"),
@@ -179,26 +533,22 @@ async def post(request):
             )
         )
     
-    current_page = 0
-    # Segment the Chinese text into words
-    segmented_words = list(jieba.cut(text_content))
+    document, complete = start_document(sid, text_content)
+    segmented_words = document.words
     
     total_pages = math.ceil(len(segmented_words) / WORDS_PER_PAGE)
-    # Get first page of words
-    page_words = segmented_words[:WORDS_PER_PAGE]
-    word_spans = [mk_word_span(word) for word in page_words]
     
     # Return the segmented text with clickable words and replace textarea with button
     return (
         Div(
-            P(*word_spans, style="line-height: 2; display: flex; flex-wrap: wrap; gap: 4px; align-items: center;"),
+            mk_page_words(document, 0, segmented_words, saved_words_version()),
             id="result",
             hx_swap_oob="true"
         ),
         Div(
             Button("←", disabled=True),
-            Span(f"Page 1 of {total_pages}", cls="page-info"),
-            Button("→", disabled=total_pages<=1, hx_post="/page/1", hx_target="#result-container") if total_pages > 1 else None,
+            mk_page_info(0, total_pages, complete),
+            Button("→", hx_get="/page/1", hx_target="#result-container") if total_pages > 1 or not complete else None,
             id="pagination-controls",
             cls="pagination-controls",
             hx_swap_oob="true"
@@ -216,11 +566,80 @@ async def post(request):
         )
     )
 
+def mk_library_entry(entry: dict):
+    """A stored text: opens it in the reader, or removes it from the library"""
+    added = time.strftime('%Y-%m-%d', time.localtime(entry['added_at']))
+    return Div(
+        A(entry['title'] or "Untitled", href=f"/library/{entry['digest']}", cls="library-title"),
+        Span(f"{entry['characters']:,} characters · {added}", cls="library-meta"),
+        Button(
+            "✕",
+            hx_delete=f"/library/{entry['digest']}",
+            hx_target="closest .library-entry",
+            hx_swap="outerHTML",
+            hx_confirm="Remove this text from the library?",
+            cls="secondary library-remove"
+        ),
+        cls="library-entry"
+    )
+
+@rt('/library')
+@offload
+def get(session):
+    """The texts this session has read, most recently opened first"""
+    entries = library.recent(session_id(session))
+    return Title("Chinese Reader"), Container(
+        Link(href="/static/styles.css", rel="stylesheet"),
+        H2("Library"),
+        A("← Back to Reader", href="/", cls="back-link"),
+        Div(
+            *[mk_library_entry(entry) for entry in entries] if entries else P("Texts you submit are kept here."),
+            id="library-list"
+        )
+    )
+
+@rt('/library/{digest}')
+@offload
+def get(digest: str, session):
+    """Open a stored text in the reader, from its stored segmentation"""
+    sid = session_id(session)
+    document = library.open(digest, session_id=sid)
+    if document is None:
+        return Response("Not in the library", status_code=404)
+    replace_document(sid, document)
+    return Redirect('/')
+
+@rt('/library/{digest}')
+@offload
+def delete(digest: str, session):
+    library.delete(session_id(session), digest)
+
 @rt('/lookup/{word}')
+@offload
 def post(word: str):
     return lookup(word)
 
+def invalidate_word(word: str):
+    """Forget cached saved state and definition cards after a word is saved or removed"""
+    saved_state.invalidate(word)
+    definition_cards.invalidate((word, True))
+    definition_cards.invalidate((word, False))
+
 def lookup(word: str):
+    # Check if word is saved
+    is_saved = saved_state.get(word)
+    if is_saved is None:
+        is_saved = is_word_saved(word)
+        saved_state.put(word, is_saved)
+    
+    # Cached as rendered markup, which is also what the cache measures
+    html = definition_cards.get((word, is_saved))
+    if html is None:
+        html = to_xml(mk_definition_card(word, is_saved), indent=False)
+        definition_cards.put((word, is_saved), html)
+    return NotStr(html)
+
+def mk_definition_card(word: str, is_saved: bool):
     result = dictionary.lookup(word)
     
     if result:
@@ -228,9 +647,6 @@ def lookup(word: str):
         # Remove empty definitions and any leading/trailing whitespace
         definitions = [d.strip() for d in definitions if d.strip()]
         
-        # Check if word is saved
-        is_saved = is_word_saved(word)
-        
         return Card(
             Div(
             H4(
@@ -260,7 +676,43 @@ def lookup(word: str):
     else:
         return Card(P(f"No definition found for: {word}", style="color: var(--pico-muted-color);"), id="definition-card")
 
+@rt('/stats')
+@offload
+def get(session):
+    """Cache, connection and document store counters, for sizing them in production"""
+    return {
+        'documents': documents.stats(),
+        'library': library.stats(),
+        'session_document_bytes': documents.session_usage(session_id(session)),
+        'dictionary_cache': dictionary.cache.stats(),
+        'search_cache': dictionary.search_cache.stats(),
+        'definition_cards': definition_cards.stats(),
+        'saved_state': saved_state.stats(),
+        'page_fragments': {**page_fragments.stats(), 'not_modified_responses': not_modified_responses},
+        'dictionary_pool': dictionary.pool_stats(),
+        'saved_words_connections': db_connections.stats(),
+        'review_sessions': review.store.stats(),
+        'wal': checkpointer.stats() if checkpointer else {},
+        'blocking_executor': blocking.executor.stats(),
+        'startup': startup.report(),
+    }
+
+@rt('/ready')
+def get():
+    """Readiness probe: 200 once startup has finished, 503 until then"""
+    report = startup.report()
+    return JSONResponse(report, status_code=200 if report['ready'] else 503)
+
+@rt('/metrics')
+def get():
+    """Request latency, per-stage histograms and query counts in Prometheus text format"""
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+def lookup_entry(word: str):
+    """Dictionary entry for word from the shared dictionary"""
+    return dictionary.lookup(word)
+
 # Set up saved words routes
-saved_words.setup_routes(app, lookup)
+saved_words.setup_routes(app, lookup, invalidate_word, lookup_entry, batch_answers=REVIEW_ANSWERS == 'batch')
 
 serve()
\ No newline at end of file
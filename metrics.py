@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence
+
+# Seconds; covers a cached lookup (~1µs) up to segmenting a novel
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, key)} {value:g}')
+        return '\n'.join(lines)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, optionally split by labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket
+                    le = f'le="{bound:g}"' if bound != '+Inf' else 'le="+Inf"'
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {total:g}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return '\n'.join(lines)
+
+REGISTRY = []
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+REQUEST_SECONDS = Histogram('reader_request_seconds', 'Request latency from first byte in to response start',
+                            ('method', 'route', 'status'))
+REQUEST_QUERIES = Histogram('reader_request_queries', 'SQL statements run while handling one request',
+                            ('database',), buckets=QUERY_BUCKETS)
+QUERIES = Counter('reader_queries_total', 'SQL statements run, by database', ('database',))
+SEGMENTATION_SECONDS = Histogram('reader_segmentation_seconds', 'jieba.cut time per batch of tokens')
+LOOKUP_SECONDS = Histogram('reader_lookup_seconds', 'ChineseDictionary.lookup latency by how the word resolved',
+                           ('result',))
+DB_SECONDS = Histogram('reader_db_seconds', 'Saved words database operation latency', ('operation',))
+RENDER_SECONDS = Histogram('reader_render_seconds', 'HTML rendering time (page fragments and whole responses)',
+                           ('part',))
+
+# Statement counts for the request being handled, by database; copied into
+# executor threads with the rest of the request's context
+_request_queries: ContextVar[Optional[Dict[str, int]]] = ContextVar('request_queries', default=None)
+# Every database a statement has been counted against, so requests that
+# never touched one still record a zero for it
+_databases = set()
+
+def count_query(database: str) -> None:
+    """Count one SQL statement against the database and the current request"""
+    QUERIES.inc(database=database)
+    _databases.add(database)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[database] = queries.get(database, 0) + 1
+
+class MetricsMiddleware:
+    """ASGI middleware recording each request's latency, route and query counts.
+
+    The route label is the matched path template (e.g. /lookup/{word}), so
+    label cardinality stays bounded by the number of routes."""
+
+    def __init__(self, app, routes=None):
+        self.app = app
+        self._routes = routes
+        self._templates = None
+
+    def _route(self, scope) -> str:
+        if self._templates is None and self._routes is not None:
+            self._templates = {getattr(r, 'endpoint', None): r.path for r in self._routes()}
+        return (self._templates or {}).get(scope.get('endpoint'), 'unmatched')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        queries = {}
+        token = _request_queries.set(queries)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                # The handler returned at `handled_at`; the rest was rendering its FT
+                handled_at = scope.get('state', {}).get('metrics_handled_at')
+                if handled_at is not None:
+                    RENDER_SECONDS.observe(time.perf_counter() - handled_at, part='response')
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope['method'],
+                                        route=self._route(scope), status=message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            for database in list(_databases):
+                REQUEST_QUERIES.observe(queries.get(database, 0), database=database)
+
+def mark_handled(resp, req) -> None:
+    """FastHTML `after` hook: note when the handler returned, before its FT is rendered"""
+    req.state.metrics_handled_at = time.perf_counter()
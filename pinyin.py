@@ -0,0 +1,96 @@
+"""Numbered pinyin to tone-marked pinyin conversion.
+
+Every Mandarin syllable in every tone (plus the u:/v spellings of ü and
+capitalised forms) is converted once at import into SYLLABLE_MARKS, so
+converting a reading is a dictionary lookup per syllable."""
+import re
+import unicodedata
+
+# Pinyin tone marks mapping
+TONE_MARKS = {
+    'a': 'āáǎà',
+    'e': 'ēéěè',
+    'i': 'īíǐì',
+    'o': 'ōóǒò',
+    'u': 'ūúǔù',
+    'ü': 'ǖǘǚǜ',
+    'v': 'ǖǘǚǜ'  # v is used as ü in pinyin numbers
+}
+
+# Order of vowels to check for adding tone marks
+VOWEL_PRIORITY = ['a', 'e', 'o', 'i', 'u', 'v']
+
+INITIALS = ['', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l', 'g', 'k', 'h', 'j', 'q', 'x',
+            'zh', 'ch', 'sh', 'r', 'z', 'c', 's', 'y', 'w']
+
+FINALS = ['a', 'o', 'e', 'ai', 'ei', 'ao', 'ou', 'an', 'en', 'ang', 'eng', 'ong', 'er', 'r',
+          'i', 'ia', 'ie', 'iao', 'iu', 'ian', 'in', 'iang', 'ing', 'iong',
+          'u', 'ua', 'uo', 'uai', 'ui', 'uan', 'un', 'uang', 'ueng',
+          'u:', 'u:e', 'u:an', 'u:n', 'v', 've', 'van', 'vn', 'ue', 'm', 'n', 'ng', 'hm', 'hng']
+
+def mark_syllable(syllable: str) -> str:
+    """Convert a single numbered pinyin syllable to tone-marked form"""
+    # If there's no tone number, keep as is
+    if not any(c.isdigit() for c in syllable):
+        return syllable
+
+    # Extract tone number and remove it
+    tone = int(re.findall(r'\d', syllable)[0])
+    base = re.sub(r'\d', '', syllable)
+
+    # Handle 'u:' or 'v' to 'ü'
+    base = base.replace('u:', 'ü').replace('v', 'ü')
+
+    # For neutral tone (tone 5), keep the original vowel without tone mark
+    if tone == 5:
+        return base
+
+    # Find the vowel to modify based on priority
+    vowel_index = -1
+    vowel_to_change = 'a'
+
+    for v in VOWEL_PRIORITY:
+        if v in base:
+            vowel_index = base.index(v)
+            vowel_to_change = v
+            break
+
+    if vowel_index >= 0:
+        # Handle special case for 'ü'
+        if vowel_to_change == 'ü':
+            vowel_to_change = 'v'
+        # Get the tone marked vowel
+        tone_index = tone - 1
+        tone_vowel = TONE_MARKS[vowel_to_change][tone_index]
+        # Replace the vowel with tone marked version
+        if vowel_to_change == 'v':
+            tone_vowel = tone_vowel.replace('v', 'ü')
+        base = base[:vowel_index] + tone_vowel + base[vowel_index + 1:]
+
+    return base
+
+def _build_syllable_marks() -> dict:
+    marks = {}
+    for initial in INITIALS:
+        for final in FINALS:
+            for tone in '12345':
+                syllable = initial + final + tone
+                marks[syllable] = mark_syllable(syllable)
+                marks[syllable.capitalize()] = mark_syllable(syllable.capitalize())
+    return marks
+
+SYLLABLE_MARKS = _build_syllable_marks()
+
+def convert(pinyin: str) -> str:
+    """Convert numbered pinyin to pinyin with tone marks"""
+    marks = SYLLABLE_MARKS
+    return ' '.join(marks.get(s) or mark_syllable(s) for s in pinyin.split())
+
+def toneless(text: str) -> str:
+    """Search key for a reading: lower-case letters only, without tones or spaces.
+
+    Numbered ('chi1 fan4'), tone-marked ('chīfàn') and bare ('chi fan')
+    spellings all give 'chifan'. ü, u: and v all become u, since few people
+    type the umlaut when searching."""
+    text = unicodedata.normalize('NFD', text.lower()).replace('v', 'u')
+    return ''.join(c for c in text if 'a' <= c <= 'z')
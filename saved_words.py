@@ -1,10 +1,12 @@
+from urllib.parse import urlencode
 from fasthtml.common import *
-from dictionary import ChineseDictionary
 from db import (
     SavedWord,
     save_word,
     delete_word,
-    get_all_saved_words,
+    get_saved_word,
+    get_saved_words_page,
+    count_saved_words,
     is_word_saved,
     update_review_stats,
     get_review_stats
@@ -14,10 +16,64 @@ from services.review import (
     end_review_session,
     get_current_session,
     advance_session,
-    calculate_next_review
+    calculate_next_review,
+    parse_answers,
+    record_answers
 )
+from services.sessions import session_id
+from services import blocking
+from services.blocking import offload
+# Saved words rendered per request; the rest load as the list is scrolled
+SAVED_WORDS_PAGE = 50
 
-dictionary = ChineseDictionary()
+def mk_saved_word_card(word: SavedWord) -> Card:
+    return Card(
+        Div(
+            Span(word.simplified, cls="saved-word-text"),
+            Span(f"[{word.pinyin}]", cls="saved-word-pinyin"),
+            Button(
+                "★",
+                cls="save-button saved compact",
+                hx_post=f"/toggle-save/{word.word}",
+                hx_target=f"#saved-word-{word.word}",
+                hx_swap="outerHTML"
+            ),
+            cls="saved-word-row"
+        ),
+        cls="saved-word-card",
+        id=f"saved-word-{word.word}"
+    )
+
+def mk_saved_word_cards(before=None) -> list:
+    """One page of saved word cards, followed by a loader for the next page if there is one"""
+    words = get_saved_words_page(SAVED_WORDS_PAGE + 1, before)
+    cards = [mk_saved_word_card(word) for word in words[:SAVED_WORDS_PAGE]]
+    if len(words) > SAVED_WORDS_PAGE:
+        last = words[SAVED_WORDS_PAGE - 1]
+        cards.append(P(
+            "Loading more…",
+            hx_get=f"/saved-words/more?{urlencode({'ts': repr(last.timestamp), 'word': last.word})}",
+            hx_trigger="revealed",
+            hx_swap="outerHTML",
+            cls="saved-words-more",
+            style="text-align: center; color: var(--pico-muted-color);"
+        ))
+    return cards
+
+def mk_saved_words_header(word_count: int, oob: bool = False) -> Div:
+    return Div(
+        Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
+        Button(
+            "Start Review",
+            hx_post="/review",
+            hx_target="#review-area",
+            cls="review-button",
+            disabled=word_count == 0
+        ),
+        cls="saved-words-header",
+        id="saved-words-header",
+        hx_swap_oob="true" if oob else None
+    )
 
 def mk_flashcard(word: SavedWord, answer_revealed: bool = False) -> Card:
     """Create a flashcard for reviewing a word"""
@@ -51,72 +107,83 @@ def mk_flashcard(word: SavedWord, answer_revealed: bool = False) -> Card:
             style="margin: 0 auto; max-width: 500px;"
         )
 
-def setup_routes(app, lookup_func):
+def mk_deck_card(word: SavedWord, index: int, total: int) -> Div:
+    """A flashcard revealed and answered in the browser; answers are queued by review-queue.js"""
+    return Div(
+        P(f"Card {index + 1} of {total}", style="text-align: center; color: var(--pico-muted-color); margin: 20px 0 5px;"),
+        Card(
+            H3(word.simplified, style="text-align: center; margin-bottom: 20px;"),
+            Button("Show Answer", onclick="reviewQueue.reveal(this)", style="display: block; margin: 0 auto;"),
+            Div(
+                P(f"[{word.pinyin}]", style="text-align: center; color: var(--pico-muted-color); margin-bottom: 15px;"),
+                P(word.traditional, style="text-align: center; color: var(--pico-muted-color); margin-bottom: 15px;") if word.traditional != word.simplified else None,
+                Div(
+                    *[P(d, style="margin: 5px 0;") for d in word.definitions.split('\n')],
+                    style="text-align: center; margin-bottom: 20px;"
+                ),
+                Div(
+                    Button("✓", onclick="reviewQueue.answer(this, true)", cls="correct-btn"),
+                    Button("✕", onclick="reviewQueue.answer(this, false)", cls="incorrect-btn"),
+                    style="display: flex; justify-content: center; gap: 10px;"
+                ),
+                cls="flashcard-answer",
+                hidden=True
+            ),
+            cls="flashcard",
+            style="margin: 0 auto; max-width: 500px;"
+        ),
+        cls="deck-card",
+        data_word=word.word,
+        hidden=index > 0
+    )
+
+def setup_routes(app, lookup_func, invalidate_func=lambda word: None, entry_func=None, batch_answers=False):
+    """batch_answers sends the whole review deck up front and posts answers in batches"""
     rt = app.route
     
     @rt('/saved-words')
+    @offload
     def get():
-        # Get all saved words ordered by most recently saved
-        words = get_all_saved_words(order_by='-timestamp')
-        word_count = len(words)
+        # Most recently saved first; later pages load as the list is scrolled
+        word_count = count_saved_words()
         
         return Title("Chinese Reader"), Container(
             Link(href="/static/styles.css", rel="stylesheet"),
+            Script(src="/static/review-queue.js") if batch_answers else None,
             H2("Saved Words"),
             Div(
                 A("← Back to Reader", href="/", cls="back-link"),
-                Div(
-                    Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
-                    Button(
-                        "Start Review",
-                        hx_post="/review",
-                        hx_target="#review-area",
-                        cls="review-button",
-                        disabled=word_count == 0
-                    ),
-                    cls="saved-words-header",
-                    id="saved-words-header"
-                ),
+                mk_saved_words_header(word_count),
                 style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px;"
             ),
             Div(
                 Div(
-                    *[
-                        Card(
-                            Div(
-                                Span(word.simplified, cls="saved-word-text"),
-                                Span(f"[{word.pinyin}]", cls="saved-word-pinyin"),
-                                Button(
-                                    "★",
-                                    cls="save-button saved compact",
-                                    hx_post=f"/toggle-save/{word.word}",
-                                    hx_target=f"#saved-word-{word.word}",
-                                    hx_swap="outerHTML"
-                                ),
-                                cls="saved-word-row"
-                            ),
-                            cls="saved-word-card",
-                            id=f"saved-word-{word.word}"
-                        )
-                        for word in words
-                    ],
+                    *mk_saved_word_cards(),
                     id="saved-words-list"
                 ),
                 id="review-area"
             )
         )
 
+    @rt('/saved-words/more')
+    @offload
+    def get(ts: float, word: str):
+        """The page of saved words after the (timestamp, word) cursor"""
+        return tuple(mk_saved_word_cards((ts, word)))
+
     @rt('/toggle-save/{word}')
+    @offload
     def post(word: str, request):
-        result = dictionary.lookup(word)
+        result = entry_func(word)
         if not result:
             return P(f"Error: Word not found", style="color: var(--pico-error-color);")
         
         # If word exists, remove it; if not, add it
         if is_word_saved(word):
             delete_word(word)
+            invalidate_func(word)
             # Get updated word count after deletion
-            word_count = len(get_all_saved_words())
+            word_count = count_saved_words()
             
             # Check if we're removing from the saved words list
             if request.headers.get("HX-Target", "").startswith("saved-word-"):
@@ -124,37 +191,13 @@ def setup_routes(app, lookup_func):
                 if word_count == 0:
                     return (
                         Div(id="saved-words-list"),
-                        Div(
-                            Span("0 words saved", cls="word-count"),
-                            Button(
-                                "Start Review",
-                                hx_post="/review",
-                                hx_target="#review-area",
-                                cls="review-button",
-                                disabled=True
-                            ),
-                            cls="saved-words-header",
-                            id="saved-words-header",
-                            hx_swap_oob="true"
-                        )
+                        mk_saved_words_header(0, oob=True)
                     )
                 
                 # Update the header with new count
                 return (
                     "",  # Empty string to remove the card
-                    Div(
-                        Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
-                        Button(
-                            "Start Review",
-                            hx_post="/review",
-                            hx_target="#review-area",
-                            cls="review-button",
-                            disabled=word_count == 0
-                        ),
-                        cls="saved-words-header",
-                        id="saved-words-header",
-                        hx_swap_oob="true"
-                    )
+                    mk_saved_words_header(word_count, oob=True)
                 )
         else:
             word_data = {
@@ -165,56 +208,31 @@ def setup_routes(app, lookup_func):
                 'definitions': '\n'.join(result['definitions'])
             }
             saved_word = save_word(word_data)
+            invalidate_func(word)
             
             # If we're in the dictionary view, return the updated lookup view
             if not request.headers.get("HX-Target", "").startswith("saved-word-"):
                 return lookup_func(word)
             
             # Get updated word count after addition
-            word_count = len(get_all_saved_words())
+            word_count = count_saved_words()
             
             # If we're in the saved words list, return the new card and updated header
             return (
-                Card(
-                    Div(
-                        Span(saved_word.simplified, cls="saved-word-text"),
-                        Span(f"[{saved_word.pinyin}]", cls="saved-word-pinyin"),
-                        Button(
-                            "★",
-                            cls="save-button saved compact",
-                            hx_post=f"/toggle-save/{word}",
-                            hx_target=f"#saved-word-{saved_word.word}",
-                            hx_swap="outerHTML"
-                        ),
-                        cls="saved-word-row"
-                    ),
-                    cls="saved-word-card",
-                    id=f"saved-word-{saved_word.word}"
-                ),
-                Div(
-                    Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
-                    Button(
-                        "Start Review",
-                        hx_post="/review",
-                        hx_target="#review-area",
-                        cls="review-button",
-                        disabled=word_count == 0
-                    ),
-                    cls="saved-words-header",
-                    id="saved-words-header",
-                    hx_swap_oob="true"
-                )
+                mk_saved_word_card(saved_word),
+                mk_saved_words_header(word_count, oob=True)
             )
         
         # Return the updated lookup view (only for the dictionary view)
         return lookup_func(word)
 
     @rt('/review')
-    def post():
+    @offload
+    def post(session):
         """Start a new review session"""
-        # Get all saved words first to check if any exist
-        all_saved_words = get_all_saved_words()
-        if not all_saved_words:
+        # Check that any words are saved before building a queue
+        word_count = count_saved_words()
+        if not word_count:
             return Div(
                 Div(
                     P("No words available for review.", style="text-align: center; color: var(--pico-muted-color);"),
@@ -224,8 +242,10 @@ def setup_routes(app, lookup_func):
             )
         
         # Start new session
-        session = start_review_session()
-        if not session or not session.current_word:
+        review = start_review_session(session_id(session))
+        # Words removed since they were queued get no card
+        cards = [card for card in map(get_saved_word, review.words) if card is not None] if review and batch_answers else []
+        if not review or not (cards if batch_answers else review.current_word):
             return Div(
                 Div(
                     P("No words available for review.", style="text-align: center; color: var(--pico-muted-color);"),
@@ -238,14 +258,14 @@ def setup_routes(app, lookup_func):
         return (
             Div(
                 Div(
-                    Div(
+                    *([mk_deck_card(card, i, len(cards)) for i, card in enumerate(cards)] if batch_answers else [Div(
                         P(
-                            f"Card 1 of {session.total_words}", 
+                            f"Card 1 of {review.total_words}", 
                             style="text-align: center; color: var(--pico-muted-color); margin: 20px 0 5px;"
                         ),
-                        mk_flashcard(session.current_word),
+                        mk_flashcard(review.current_word),
                         style="display: flex; flex-direction: column; align-items: center;"
-                    ),
+                    )]),
                     id="saved-words-list",
                     style="display: block; width: 100%;"
                 ),
@@ -253,7 +273,7 @@ def setup_routes(app, lookup_func):
                 style="max-width: 800px; margin: 20px auto 0;"
             ),
             Div(
-                Span(f"{len(all_saved_words)} word{'s' if len(all_saved_words) != 1 else ''} saved", cls="word-count"),
+                Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
                 Button(
                     "End Review",
                     hx_post="/end-review",
@@ -267,26 +287,29 @@ def setup_routes(app, lookup_func):
         )
 
     @rt('/review/reveal/{word}')
-    def post(word: str):
+    @offload
+    def post(word: str, session):
         """Reveal the answer for a flashcard"""
-        session = get_current_session()
-        if not session or not session.current_word:
+        review = get_current_session(session_id(session))
+        if not review or not review.current_word:
             return "Review session expired"
         
-        current_word = session.current_word
+        current_word = review.current_word
         if current_word.word != word:
             return "Word mismatch error"
         
         return mk_flashcard(current_word, answer_revealed=True)
 
     @rt('/review/answer/{result}/{word}')
-    def post(result: str, word: str):
+    @offload
+    def post(result: str, word: str, session):
         """Handle the answer (correct/incorrect) and show the next card"""
-        session = get_current_session()
-        if not session or not session.current_word:
+        sid = session_id(session)
+        review = get_current_session(sid)
+        if not review or not review.current_word:
             return "Review session expired"
         
-        current_word = session.current_word
+        current_word = review.current_word
         if current_word.word != word:
             return "Word mismatch error"
         
@@ -297,60 +320,27 @@ def setup_routes(app, lookup_func):
         update_review_stats(word, is_correct, next_review, interval, ease_factor)
         
         # Move to next word
-        has_more = advance_session()
+        has_more = advance_session(sid)
         
         # Check if session is complete
         if not has_more:
-            # Get all saved words ordered by most recently saved
-            words = get_all_saved_words(order_by='-timestamp')
-            word_count = len(words)
-            
+            # Back to the saved words list, most recently saved first
             return (
                 Div(
-                    *[
-                        Card(
-                            Div(
-                                Span(word.simplified, cls="saved-word-text"),
-                                Span(f"[{word.pinyin}]", cls="saved-word-pinyin"),
-                                Button(
-                                    "★",
-                                    cls="save-button saved compact",
-                                    hx_post=f"/toggle-save/{word.word}",
-                                    hx_target=f"#saved-word-{word.word}",
-                                    hx_swap="outerHTML"
-                                ),
-                                cls="saved-word-row"
-                            ),
-                            cls="saved-word-card",
-                            id=f"saved-word-{word.word}"
-                        )
-                        for word in words
-                    ],
+                    *mk_saved_word_cards(),
                     id="saved-words-list"
                 ),
-                Div(
-                    Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
-                    Button(
-                        "Start Review",
-                        hx_post="/review",
-                        hx_target="#review-area",
-                        cls="review-button",
-                        disabled=word_count == 0
-                    ),
-                    cls="saved-words-header",
-                    id="saved-words-header",
-                    hx_swap_oob="true"
-                )
+                mk_saved_words_header(count_saved_words(), oob=True)
             )
         
         # Show next card
-        session = get_current_session()
-        next_word = session.current_word
+        review = get_current_session(sid)
+        next_word = review.current_word
         return Div(
             Div(
                 Div(
                     P(
-                        f"Card {session.current_index + 1} of {session.total_words}",
+                        f"Card {review.current_index + 1} of {review.total_words}",
                         style="text-align: center; color: var(--pico-muted-color); margin: 20px 0 5px;"
                     ),
                     mk_flashcard(next_word),
@@ -363,49 +353,27 @@ def setup_routes(app, lookup_func):
             style="max-width: 800px; margin: 20px auto 0;"
         )
 
+    @rt('/review/answers')
+    async def post(request, session):
+        """Apply queued answers, posted as JSON: {"answers": [{"id", "word", "correct", "at"}, ...]}"""
+        try:
+            answers = parse_answers(await request.json())
+        except ValueError as e:  # includes malformed JSON
+            return JSONResponse({'error': f'expected {{"answers": [{{"id", "word", "correct", "at"}}]}}: {e}'},
+                                status_code=400)
+        return await blocking.executor.run(record_answers, session_id(session), answers)
+
     @rt('/end-review')
-    def post():
+    @offload
+    def post(session):
         """End the current review session and restore the saved words view"""
-        end_review_session()
-        
-        # Get all saved words ordered by most recently saved
-        words = get_all_saved_words(order_by='-timestamp')
-        word_count = len(words)
+        end_review_session(session_id(session))
         
+        # Back to the saved words list, most recently saved first
         return (
             Div(
-                *[
-                    Card(
-                        Div(
-                            Span(word.simplified, cls="saved-word-text"),
-                            Span(f"[{word.pinyin}]", cls="saved-word-pinyin"),
-                            Button(
-                                "★",
-                                cls="save-button saved compact",
-                                hx_post=f"/toggle-save/{word.word}",
-                                hx_target=f"#saved-word-{word.word}",
-                                hx_swap="outerHTML"
-                            ),
-                            cls="saved-word-row"
-                        ),
-                        cls="saved-word-card",
-                        id=f"saved-word-{word.word}"
-                    )
-                    for word in words
-                ],
+                *mk_saved_word_cards(),
                 id="saved-words-list"
             ),
-            Div(
-                Span(f"{word_count} word{'s' if word_count != 1 else ''} saved", cls="word-count"),
-                Button(
-                    "Start Review",
-                    hx_post="/review",
-                    hx_target="#review-area",
-                    cls="review-button",
-                    disabled=word_count == 0
-                ),
-                cls="saved-words-header",
-                id="saved-words-header",
-                hx_swap_oob="true"
-            )
+            mk_saved_words_header(count_saved_words(), oob=True)
         ) 
\ No newline at end of file
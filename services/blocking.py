@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class BlockingExecutor:
+    """Bounded thread pool for blocking dictionary, database and segmentation work.
+
+    Route handlers await run() so the event loop never blocks on SQLite or
+    jieba; at most `workers` calls run at once and the rest queue, with
+    queue depth and time spent waiting for a worker tracked for /stats."""
+
+    def __init__(self, workers: int = 16, name: str = 'blocking'):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._max_queued = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+    def _call(self, submitted: float, func, args, kwargs):
+        wait = time.perf_counter() - submitted
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_time += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on a worker thread and await its result"""
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        loop = asyncio.get_running_loop()
+        # Carry the request's context (e.g. its metrics query counter) into the worker
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._pool, context.run, self._call, time.perf_counter(), func, args, kwargs)
+
+    def stats(self) -> dict:
+        """Queue depth, concurrency and wait-time counters (seconds)"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': self._completed,
+                'max_queued': self._max_queued,
+                'wait_time': self._wait_time,
+                'avg_wait': self._wait_time / self._completed if self._completed else 0.0,
+                'max_wait': self._max_wait,
+            }
+
+# Shared by every route; resized by configure() at startup
+executor = BlockingExecutor()
+
+def configure(workers: int) -> None:
+    global executor
+    executor = BlockingExecutor(workers)
+
+def offload(handler):
+    """Turn a sync route handler into an async one that runs on the blocking executor.
+
+    The wrapper keeps the handler's name and signature, so FastHTML still
+    routes by method name and injects the same parameters."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        return await executor.run(handler, *args, **kwargs)
+    return wrapper
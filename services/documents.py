@@ -0,0 +1,191 @@
+import hashlib
+import sys
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Optional
+from cache import LRUCache
+from db.connections import ThreadLocalDatabase
+from services.sessions import session_label
+from services.tokens import TokenSpans
+
+def content_digest(text: str) -> str:
+    """Content hash of a text, identifying it across sessions, workers and the library"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+@dataclass
+class Document:
+    """The text a reader submitted, its segmentation and where they are in it"""
+    text: str = ""
+    words: Optional[TokenSpans] = None  # token offsets into text; lists of str are converted
+    current_page: int = 0
+    complete: bool = True  # False while the rest of the text is still being segmented
+
+    def __post_init__(self):
+        if self.words is None:
+            self.words = TokenSpans(self.text)
+        elif not isinstance(self.words, TokenSpans):
+            self.words = TokenSpans.from_tokens(self.text, self.words)
+
+    @cached_property
+    def digest(self) -> str:
+        """Content hash of the text, identifying the document across sessions and workers"""
+        return content_digest(self.text)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the document"""
+        return sys.getsizeof(self.text) + self.words.memory_usage()
+
+class MemoryDocumentStore:
+    """Documents kept in process memory.
+
+    Sessions are evicted least recently used first once max_sessions or
+    max_bytes is exceeded, and dropped after ttl seconds without access."""
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 256 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self._cache = LRUCache(max_entries=max_sessions, max_bytes=max_bytes,
+                               sizeof=lambda entry: entry[0].memory_usage())
+        self.expirations = 0
+
+    def get(self, session_id: str) -> Optional[Document]:
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+        document, accessed_at = entry
+        if time.time() - accessed_at > self.ttl:
+            self._cache.invalidate(session_id)
+            self.expirations += 1
+            return None
+        entry[1] = time.time()
+        return document
+
+    def save(self, session_id: str, document: Document) -> None:
+        self._cache.put(session_id, [document, time.time()])
+
+    def set_page(self, session_id: str, page: int) -> None:
+        document = self.get(session_id)
+        if document is not None:
+            document.current_page = page
+
+    def delete(self, session_id: str) -> None:
+        self._cache.invalidate(session_id)
+
+    def session_usage(self, session_id: str) -> int:
+        """Bytes held for one session"""
+        document = self.get(session_id)
+        return document.memory_usage() if document else 0
+
+    def stats(self, top: int = 20) -> dict:
+        entries = self._cache.items()
+        return {
+            'backend': 'memory',
+            'sessions': len(entries),
+            'bytes': sum(size for _, _, size in entries),
+            'max_bytes': self._cache.max_bytes,
+            'evictions': self._cache.evictions,
+            'expirations': self.expirations,
+            'largest_sessions': dict(sorted(((session_label(key), size) for key, _, size in entries),
+                                            key=lambda kv: kv[1], reverse=True)[:top]),
+        }
+
+# Bytes a session row holds itself (nothing for documents read from the library)
+_STORED_BYTES = 'coalesce(length(CAST(text AS BLOB)), 0) + coalesce(length(token_ends), 0)'
+
+class SQLiteDocumentStore:
+    """Documents persisted in SQLite, shared by every worker process.
+
+    With a library, sessions reading a stored document keep only its digest
+    and page; the text and segmentation are read from the library."""
+
+    def __init__(self, path: str = 'data/documents.db', ttl: float = 7 * 24 * 3600, library=None):
+        self.ttl = ttl
+        self.library = library
+        self.connections = ThreadLocalDatabase(path)
+        columns = {row[1] for row in self._db().execute('PRAGMA table_info(documents)')}
+        if columns and 'token_ends' not in columns:
+            # Session documents are disposable; drop the old JSON token layout
+            self._db().execute('DROP TABLE documents')
+        elif columns and 'digest' not in columns:
+            self._db().execute('ALTER TABLE documents ADD COLUMN digest TEXT')
+        self._db().execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                session_id TEXT PRIMARY KEY,
+                text TEXT,
+                token_ends BLOB,
+                current_page INTEGER,
+                accessed_at REAL,
+                complete INTEGER DEFAULT 1,
+                digest TEXT
+            )
+        ''')
+        self._db().execute('CREATE INDEX IF NOT EXISTS idx_documents_accessed_at ON documents(accessed_at)')
+        self._db().execute('CREATE INDEX IF NOT EXISTS idx_documents_digest ON documents(digest)')
+        if library is not None:
+            # Texts sessions read from the library are kept while they do
+            library.in_use = self.references
+
+    def _db(self):
+        return self.connections.get()
+
+    def get(self, session_id: str) -> Optional[Document]:
+        rows = self._db().execute(
+            'SELECT text, token_ends, current_page, complete, digest FROM documents WHERE session_id=? AND accessed_at>=?',
+            (session_id, time.time() - self.ttl)).fetchall()
+        if not rows:
+            return None
+        text, token_ends, current_page, complete, digest = rows[0]
+        self._db().execute('UPDATE documents SET accessed_at=? WHERE session_id=?', (time.time(), session_id))
+        if text is None:
+            return self.library.open(digest, current_page) if self.library and digest else None
+        return Document(text=text, words=TokenSpans.from_bytes(text, token_ends), current_page=current_page, complete=bool(complete))
+
+    def save(self, session_id: str, document: Document) -> None:
+        db = self._db()
+        # Piggyback expiry on writes so the table never needs a separate sweeper
+        db.execute('DELETE FROM documents WHERE accessed_at<?', (time.time() - self.ttl,))
+        if document.complete and document.text and self.library is not None and document.digest in self.library:
+            text, token_ends = None, None
+        else:
+            text, token_ends = document.text, document.words.to_bytes()
+        db.execute('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (session_id, text, token_ends, document.current_page, time.time(),
+                    int(document.complete), document.digest if document.text else None))
+
+    def set_page(self, session_id: str, page: int) -> None:
+        self._db().execute('UPDATE documents SET current_page=?, accessed_at=? WHERE session_id=?',
+                           (page, time.time(), session_id))
+
+    def delete(self, session_id: str) -> None:
+        self._db().execute('DELETE FROM documents WHERE session_id=?', (session_id,))
+
+    def references(self, digest: str) -> bool:
+        """Whether an unexpired session reads the library text with this digest"""
+        return bool(self._db().execute(
+            'SELECT 1 FROM documents WHERE digest=? AND text IS NULL AND accessed_at>=? LIMIT 1',
+            (digest, time.time() - self.ttl)).fetchall())
+
+    def session_usage(self, session_id: str) -> int:
+        """Bytes stored for one session (documents in the library count as zero)"""
+        rows = self._db().execute(
+            f'SELECT {_STORED_BYTES} FROM documents WHERE session_id=?', (session_id,)).fetchall()
+        return rows[0][0] if rows else 0
+
+    def stats(self, top: int = 20) -> dict:
+        db = self._db()
+        sessions, total = db.execute(f'SELECT count(*), coalesce(sum({_STORED_BYTES}), 0) FROM documents').fetchall()[0]
+        largest = db.execute(f'SELECT session_id, {_STORED_BYTES} AS bytes FROM documents ORDER BY bytes DESC LIMIT ?', (top,)).fetchall()
+        return {
+            'backend': 'sqlite',
+            'sessions': sessions,
+            'bytes': total,
+            'largest_sessions': {session_label(sid): size for sid, size in largest},
+        }
+
+def create_store(backend: str = 'memory', library=None):
+    """Document store for the configured backend ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return MemoryDocumentStore()
+    if backend == 'sqlite':
+        return SQLiteDocumentStore(library=library)
+    raise ValueError(f"Unknown document store {backend!r}, expected 'memory' or 'sqlite'")
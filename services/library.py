@@ -0,0 +1,213 @@
+import sys
+import time
+import zlib
+from typing import Callable, List, Optional
+from cache import LRUCache
+from db.connections import ThreadLocalDatabase
+from services.documents import Document
+from services.tokens import TokenSpans
+
+# Characters of a document's first line shown as its title
+TITLE_CHARS = 40
+
+# Bytes a stored text takes, counted against max_bytes
+_STORED_BYTES = 'length(text) + length(token_lengths)'
+
+def title_of(text: str) -> str:
+    """First non-blank line of the text, shortened to TITLE_CHARS"""
+    line = next((line.strip() for line in text.splitlines() if line.strip()), '')
+    return line if len(line) <= TITLE_CHARS else line[:TITLE_CHARS - 1] + '…'
+
+class DocumentLibrary:
+    """Each session's segmented texts, stored once per content hash.
+
+    The text and its token lengths are kept zlib-compressed, so reopening a
+    document (or resubmitting the same text) rebuilds its segmentation
+    without running jieba again. A session only lists, opens and removes the
+    texts it links to; a text is deleted once no session links to it and no
+    session is reading it. Decoded documents are cached by digest and shared
+    by every session reading them.
+
+    Retention: a text drops out of a session's library once that session has
+    not opened it for max_age seconds, and while the stored texts take more
+    than max_bytes, the least recently opened ones are deleted outright
+    (0 disables either limit)."""
+
+    def __init__(self, path: str = 'data/library.db', cache_bytes: int = 64 * 1024 * 1024,
+                 max_bytes: int = 0, max_age: float = 0):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.connections = ThreadLocalDatabase(path)
+        self._cache = LRUCache(max_entries=1000, max_bytes=cache_bytes,
+                               sizeof=lambda spans: sys.getsizeof(spans.text) + spans.memory_usage())
+        # Whether a session is reading the text with this digest; set by the
+        # document store when it keeps only digests for library texts
+        self.in_use: Callable[[str], bool] = lambda digest: False
+        self.collected = 0
+        self.expired = 0
+        self.evicted = 0
+        self._db().execute('''
+            CREATE TABLE IF NOT EXISTS library (
+                digest TEXT PRIMARY KEY,
+                title TEXT,
+                text BLOB,
+                token_lengths BLOB,
+                characters INTEGER,
+                tokens INTEGER,
+                added_at REAL,
+                opened_at REAL
+            )
+        ''')
+        self._db().execute('CREATE INDEX IF NOT EXISTS idx_library_opened_at ON library(opened_at)')
+        self._db().execute('''
+            CREATE TABLE IF NOT EXISTS library_links (
+                session_id TEXT,
+                digest TEXT,
+                added_at REAL,
+                opened_at REAL,
+                PRIMARY KEY (session_id, digest)
+            )
+        ''')
+        self._db().execute('CREATE INDEX IF NOT EXISTS idx_library_links_digest ON library_links(digest)')
+        self._db().execute('CREATE INDEX IF NOT EXISTS idx_library_links_opened_at ON library_links(session_id, opened_at)')
+
+    def _db(self):
+        return self.connections.get()
+
+    def __contains__(self, digest: str) -> bool:
+        # Not answered from the cache: another worker may have collected it
+        return bool(self._db().execute('SELECT 1 FROM library WHERE digest=?', (digest,)).fetchall())
+
+    def add(self, document: Document, session_id: str) -> bool:
+        """Store a completely segmented document in the session's library; False if its text was already stored"""
+        if not document.complete:
+            raise ValueError("Only completely segmented documents can be added to the library")
+        digest, now = document.digest, time.time()
+        db = self._db()
+        added = False
+        if not self.link(session_id, digest):
+            # Compressed before the transaction, which holds the write lock
+            row = (digest, title_of(document.text), zlib.compress(document.text.encode('utf-8')),
+                   document.words.to_compressed(), len(document.text), len(document.words), now, now)
+            # Stored and linked together, so it is never collected in between
+            with db.conn:
+                db.execute('INSERT OR IGNORE INTO library VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row)
+                added = db.conn.changes() > 0
+                self._link(db, session_id, digest, now)
+        self._cache.put(digest, document.words)
+        if added:
+            # Piggyback retention on growth so the library never needs a separate sweeper
+            self.prune()
+        return added
+
+    def _link(self, db, session_id: str, digest: str, now: float) -> bool:
+        # Only to a stored text, so a link never outlives its text
+        db.execute('INSERT INTO library_links SELECT ?, digest, ?, ? FROM library WHERE digest=? '
+                   'ON CONFLICT DO UPDATE SET opened_at=excluded.opened_at', (session_id, now, now, digest))
+        return db.conn.changes() > 0
+
+    def link(self, session_id: str, digest: str) -> bool:
+        """Put a stored text in the session's library (at the top); False if it is not stored"""
+        return self._link(self._db(), session_id, digest, time.time())
+
+    def open(self, digest: str, current_page: int = 0, session_id: Optional[str] = None) -> Optional[Document]:
+        """The stored document, or None.
+
+        With a session, only a text in that session's library is opened, and
+        it moves to the top of the listing."""
+        if session_id is not None:
+            db, now = self._db(), time.time()
+            db.execute('UPDATE library_links SET opened_at=? WHERE session_id=? AND digest=?', (now, session_id, digest))
+            if db.conn.changes() == 0:
+                return None
+            db.execute('UPDATE library SET opened_at=? WHERE digest=?', (now, digest))
+        spans = self._cache.get(digest)
+        if spans is None:
+            rows = self._db().execute('SELECT text, token_lengths FROM library WHERE digest=?', (digest,)).fetchall()
+            if not rows:
+                return None
+            text = zlib.decompress(rows[0][0]).decode('utf-8')
+            spans = TokenSpans.from_compressed(text, rows[0][1])
+            self._cache.put(digest, spans)
+        document = Document(text=spans.text, words=spans, current_page=current_page)
+        # Already known, so skip hashing the text again
+        document.__dict__['digest'] = digest
+        return document
+
+    def delete(self, session_id: str, digest: str) -> None:
+        """Remove a text from the session's library, and from storage once nothing refers to it"""
+        self._db().execute('DELETE FROM library_links WHERE session_id=? AND digest=?', (session_id, digest))
+        self.collect([digest])
+
+    def collect(self, digests: Optional[List[str]] = None) -> int:
+        """Delete the given stored texts (default: all) that no session links to or is reading"""
+        db = self._db()
+        if digests is None:
+            digests = [digest for (digest,) in db.execute(
+                'SELECT digest FROM library WHERE digest NOT IN (SELECT digest FROM library_links)').fetchall()]
+        collected = 0
+        for digest in digests:
+            if self.in_use(digest):
+                continue
+            # Rechecked in the statement, in case another session linked it meanwhile
+            db.execute('DELETE FROM library WHERE digest=? AND NOT EXISTS '
+                       '(SELECT 1 FROM library_links WHERE digest=?)', (digest, digest))
+            if db.conn.changes():
+                self._cache.invalidate(digest)
+                collected += 1
+        self.collected += collected
+        return collected
+
+    def prune(self) -> None:
+        """Apply the retention limits, then delete every text nothing refers to"""
+        db = self._db()
+        if self.max_age:
+            db.execute('DELETE FROM library_links WHERE opened_at<?', (time.time() - self.max_age,))
+            self.expired += db.conn.changes()
+        self.collect()
+        if not self.max_bytes:
+            return
+        excess = db.execute(f'SELECT coalesce(sum({_STORED_BYTES}), 0) FROM library').fetchall()[0][0] - self.max_bytes
+        if excess <= 0:
+            return
+        for digest, size in db.execute(f'SELECT digest, {_STORED_BYTES} FROM library ORDER BY opened_at').fetchall():
+            if excess <= 0:
+                break
+            if self.in_use(digest):
+                continue
+            with db.conn:
+                db.execute('DELETE FROM library_links WHERE digest=?', (digest,))
+                db.execute('DELETE FROM library WHERE digest=?', (digest,))
+            self._cache.invalidate(digest)
+            excess -= size
+            self.evicted += 1
+
+    def recent(self, session_id: str, limit: int = 100) -> List[dict]:
+        """The session's stored documents, most recently opened first"""
+        rows = self._db().execute(
+            'SELECT l.digest, title, characters, tokens, l.added_at, l.opened_at FROM library_links l '
+            'JOIN library USING (digest) WHERE l.session_id=? ORDER BY l.opened_at DESC LIMIT ?',
+            (session_id, limit)).fetchall()
+        return [dict(zip(('digest', 'title', 'characters', 'tokens', 'added_at', 'opened_at'), row)) for row in rows]
+
+    def stats(self) -> dict:
+        db = self._db()
+        documents, characters, tokens, text_bytes, token_bytes = db.execute(
+            'SELECT count(*), coalesce(sum(characters), 0), coalesce(sum(tokens), 0), '
+            'coalesce(sum(length(text)), 0), coalesce(sum(length(token_lengths)), 0) FROM library').fetchall()[0]
+        links, sessions = db.execute('SELECT count(*), count(DISTINCT session_id) FROM library_links').fetchall()[0]
+        return {
+            'documents': documents,
+            'links': links,
+            'sessions': sessions,
+            'collected': self.collected,
+            'max_bytes': self.max_bytes,
+            'max_age': self.max_age,
+            'expired_links': self.expired,
+            'evicted': self.evicted,
+            'characters': characters,
+            'tokens': tokens,
+            'text_bytes': text_bytes,
+            'token_bytes': token_bytes,
+            'cache': self._cache.stats(),
+        }
@@ -1,28 +1,41 @@
-from dataclasses import dataclass
+import json
+import math
+from dataclasses import dataclass, field
 from typing import List, Optional
 import time
-from db import SavedWord, ReviewStats, update_review_stats, get_words_for_review
+from cache import LRUCache
+from db import (SavedWord, ReviewStats, connections, get_saved_word, get_review_stats, is_word_saved,
+                update_review_stats, get_words_for_review, claim_answer, forget_answers)
+
+# Applied answer ids are kept this long (seconds); a browser that lost a
+# batch's response and stays offline for longer could apply it twice
+ANSWER_ID_TTL = 30 * 24 * 3600
 
 @dataclass
 class ReviewSession:
-    words: List[SavedWord]
+    words: List[str]  # word ids; each card is loaded from saved_words when shown
     current_index: int = 0
     total_words: int = 0
+    _current: Optional[SavedWord] = field(default=None, repr=False, compare=False)
     
     @property
     def current_word(self) -> Optional[SavedWord]:
-        if self.current_index < len(self.words):
-            return self.words[self.current_index]
-        return None
+        if self.current_index >= len(self.words):
+            return None
+        word = self.words[self.current_index]
+        if self._current is None or self._current.word != word:
+            self._current = get_saved_word(word)
+        return self._current
     
     @property
     def is_complete(self) -> bool:
         return self.current_index >= len(self.words)
 
-def calculate_next_review(correct: bool, stats: Optional[ReviewStats]) -> tuple[float, float, float]:
+def calculate_next_review(correct: bool, stats: Optional[ReviewStats],
+                          reviewed_at: Optional[float] = None) -> tuple[float, float, float]:
     """Calculate the next review time using a modified SuperMemo 2 algorithm.
     Returns (next_review_timestamp, new_interval, new_ease_factor)"""
-    current_time = time.time()
+    current_time = reviewed_at if reviewed_at is not None else time.time()
     
     # Default values for new words
     ease_factor = stats.ease_factor if stats else 2.5
@@ -48,34 +61,195 @@ def calculate_next_review(correct: bool, stats: Optional[ReviewStats]) -> tuple[
     
     return next_review, interval, ease_factor
 
-# Global review session state
-current_session: Optional[ReviewSession] = None
+class MemoryReviewStore:
+    """Review sessions kept in process memory, dropped after ttl seconds idle"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self._cache = LRUCache(max_entries=max_sessions, sizeof=lambda entry: 0)
+
+    def get(self, session_id: str) -> Optional[ReviewSession]:
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+        review, accessed_at = entry
+        if time.time() - accessed_at > self.ttl:
+            self._cache.invalidate(session_id)
+            return None
+        entry[1] = time.time()
+        return review
+
+    def save(self, session_id: str, review: ReviewSession) -> None:
+        self._cache.put(session_id, [review, time.time()])
+
+    def advance(self, session_id: str, steps: int = 1) -> Optional[ReviewSession]:
+        review = self.get(session_id)
+        if review is not None:
+            review.current_index += steps
+        return review
+
+    def delete(self, session_id: str) -> None:
+        self._cache.invalidate(session_id)
+
+    def stats(self) -> dict:
+        return {'backend': 'memory', 'sessions': len(self._cache)}
+
+class SQLiteReviewStore:
+    """Review sessions persisted next to the review stats, so they survive
+    restarts and are shared by every worker process"""
+
+    def __init__(self, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        connections.get().execute('''
+            CREATE TABLE IF NOT EXISTS review_sessions (
+                session_id TEXT PRIMARY KEY,
+                words TEXT,
+                current_index INTEGER,
+                accessed_at REAL
+            )
+        ''')
+        connections.get().execute(
+            'CREATE INDEX IF NOT EXISTS idx_review_sessions_accessed_at ON review_sessions(accessed_at)')
+
+    def get(self, session_id: str) -> Optional[ReviewSession]:
+        db = connections.get()
+        rows = db.execute(
+            'SELECT words, current_index FROM review_sessions WHERE session_id=? AND accessed_at>=?',
+            (session_id, time.time() - self.ttl)).fetchall()
+        if not rows:
+            return None
+        words, current_index = rows[0]
+        db.execute('UPDATE review_sessions SET accessed_at=? WHERE session_id=?', (time.time(), session_id))
+        words = json.loads(words)
+        return ReviewSession(words=words, current_index=current_index, total_words=len(words))
+
+    def save(self, session_id: str, review: ReviewSession) -> None:
+        db = connections.get()
+        # Piggyback expiry on writes so the table never needs a separate sweeper
+        db.execute('DELETE FROM review_sessions WHERE accessed_at<?', (time.time() - self.ttl,))
+        db.execute('INSERT OR REPLACE INTO review_sessions VALUES (?, ?, ?, ?)',
+                   (session_id, json.dumps(review.words, ensure_ascii=False), review.current_index, time.time()))
+
+    def advance(self, session_id: str, steps: int = 1) -> Optional[ReviewSession]:
+        connections.get().execute(
+            'UPDATE review_sessions SET current_index=current_index+?, accessed_at=? WHERE session_id=?',
+            (steps, time.time(), session_id))
+        return self.get(session_id)
 
-def start_review_session(limit: int = 10) -> Optional[ReviewSession]:
-    """Start a new review session"""
-    global current_session
+    def delete(self, session_id: str) -> None:
+        connections.get().execute('DELETE FROM review_sessions WHERE session_id=?', (session_id,))
+
+    def stats(self) -> dict:
+        sessions = connections.get().execute('SELECT count(*) FROM review_sessions').fetchall()[0][0]
+        return {'backend': 'sqlite', 'sessions': sessions}
+
+def create_review_store(backend: str = 'memory'):
+    """Review session store for the configured backend ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return MemoryReviewStore()
+    if backend == 'sqlite':
+        return SQLiteReviewStore()
+    raise ValueError(f"Unknown review store {backend!r}, expected 'memory' or 'sqlite'")
+
+# Review sessions by browser session id; replaced by configure_store() at startup
+store = MemoryReviewStore()
+
+def configure_store(backend: str) -> None:
+    global store
+    store = create_review_store(backend)
+
+def start_review_session(session_id: str, limit: int = 10) -> Optional[ReviewSession]:
+    """Start a new review session, replacing any the reader already had"""
     words = get_words_for_review(limit)
     if not words:
         return None
     
-    current_session = ReviewSession(words=words, total_words=len(words))
-    return current_session
+    review = ReviewSession(words=[w.word for w in words], total_words=len(words))
+    review._current = words[0]
+    store.save(session_id, review)
+    return review
 
-def end_review_session() -> None:
-    """End the current review session"""
-    global current_session
-    current_session = None
+def end_review_session(session_id: str) -> None:
+    """End the reader's review session"""
+    store.delete(session_id)
 
-def get_current_session() -> Optional[ReviewSession]:
-    """Get the current review session"""
-    return current_session
+def get_current_session(session_id: str) -> Optional[ReviewSession]:
+    """The reader's review session, if one is running and has not expired"""
+    return store.get(session_id)
 
-def advance_session() -> bool:
+def advance_session(session_id: str) -> bool:
     """Advance to the next word in the session.
     Returns True if there are more words, False if session is complete."""
-    global current_session
-    if not current_session:
+    review = store.advance(session_id)
+    if not review:
         return False
-        
-    current_session.current_index += 1
-    return not current_session.is_complete 
\ No newline at end of file
+    
+    return not review.is_complete
+
+def parse_answers(payload) -> List[dict]:
+    """Validated answers from a /review/answers body; raises ValueError if malformed.
+
+    Each answer needs a str `word`, a bool `correct` and a numeric `at`
+    (seconds since the epoch). `id` identifies the answer so a batch sent
+    twice is applied once; answers queued before ids existed fall back to
+    their word and timestamp, which the resent copy repeats exactly."""
+    answers = payload.get('answers') if isinstance(payload, dict) else None
+    if not isinstance(answers, list):
+        raise ValueError("expected an answers list")
+    parsed = []
+    for answer in answers:
+        if not isinstance(answer, dict):
+            raise ValueError("each answer must be an object")
+        word, correct, at, answer_id = (answer.get(k) for k in ('word', 'correct', 'at', 'id'))
+        if not isinstance(word, str) or not word:
+            raise ValueError("answer word must be a non-empty string")
+        if not isinstance(correct, bool):
+            raise ValueError("answer correct must be true or false")
+        if isinstance(at, bool) or not isinstance(at, (int, float)) or not math.isfinite(at):
+            raise ValueError("answer at must be a number")
+        if answer_id is None:
+            answer_id = f"{word}@{at!r}"
+        elif not isinstance(answer_id, str) or not 0 < len(answer_id) <= 100:
+            raise ValueError("answer id must be a string of at most 100 characters")
+        parsed.append({'id': answer_id, 'word': word, 'correct': correct, 'at': float(at)})
+    return parsed
+
+def record_answers(session_id: str, answers: List[dict]) -> dict:
+    """Apply a batch of answers from parse_answers() in one transaction.
+
+    Answers whose id was already applied (by an earlier flush that lost its
+    response) are skipped. Each answer is scheduled as of its client
+    timestamp, never later than now, and never before the word's last
+    review, since clocks differ between devices."""
+    now = time.time()
+    applied = 0
+    db = connections.get()
+    with db.conn:
+        forget_answers(now - ANSWER_ID_TTL)
+        for answer in answers:
+            word, is_correct = answer['word'], answer['correct']
+            if not is_word_saved(word) or not claim_answer(answer['id']):
+                continue
+            stats = get_review_stats(word)
+            reviewed_at = min(answer['at'], now)
+            if stats is not None:
+                reviewed_at = max(reviewed_at, stats.last_reviewed)
+            next_review, interval, ease_factor = calculate_next_review(is_correct, stats, reviewed_at)
+            update_review_stats(word, is_correct, next_review, interval, ease_factor, reviewed_at)
+            applied += 1
+
+    # Move the reader's session past the cards these answers cover
+    review = store.get(session_id)
+    steps = 0
+    if review is not None:
+        for answer in answers:
+            index = review.current_index + steps
+            # Words removed since the review started were never shown as cards
+            while (index < len(review.words) and review.words[index] != answer['word']
+                   and not is_word_saved(review.words[index])):
+                index += 1
+            if index < len(review.words) and review.words[index] == answer['word']:
+                steps = index - review.current_index + 1
+        if steps:
+            store.advance(session_id, steps)
+    return {'received': len(answers), 'applied': applied, 'advanced': steps}
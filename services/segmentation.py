@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import threading
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, List, Optional
+import jieba
+import metrics
+from services.tokens import TokenSpans
+
+# Tokens appended per batch by the background worker; waiters are woken per batch
+BATCH_SIZE = 500
+
+# With a process pool, background work past this size is cut in the workers,
+# so jieba never holds this process's GIL and other readers' requests keep
+# their latency; shorter remainders take well under a second in-process
+PARALLEL_MIN_CHARS = 20_000
+# Target characters per chunk handed to a worker process
+CHUNK_CHARS = 50_000
+
+# jieba yields each of these as a token of its own (or ends a '\r\n' token
+# with '\n'), so cutting the text right after one never changes the result
+BOUNDARIES = '\n。！？；'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='segment')
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_workers = 0
+_pool_lock = threading.Lock()
+
+# Added to the worker processes' nice value, so the CPU goes to the server's
+# requests first and segmentation uses whatever is left over
+WORKER_NICENESS = 10
+
+def _initialize_worker() -> None:
+    # A plain function, since other start methods pickle the initializer
+    os.nice(WORKER_NICENESS)
+    jieba.initialize()
+
+def process_pool(workers: int, start_method: str = 'fork') -> ProcessPoolExecutor:
+    """Pool of segmentation worker processes.
+
+    Workers are forked from a parent whose jieba dictionary is already
+    loaded, so each one starts with the prefix dictionary in memory instead
+    of rebuilding it; the initializer is a no-op safety net (and does the
+    loading for other start methods)."""
+    jieba.initialize()
+    context = multiprocessing.get_context(start_method)
+    if start_method == 'forkserver':
+        # Workers fork from a server that already has jieba imported
+        context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_initialize_worker)
+
+def configure_processes(workers: int) -> None:
+    """Use `workers` processes for background segmentation (0 keeps it in-process)"""
+    global _process_pool, _process_workers
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+    _process_workers = workers
+    _process_pool = process_pool(workers) if workers > 0 else None
+    if _process_pool is not None:
+        # Fork the workers now, before request threads hold any locks
+        list(_process_pool.map(str, range(workers)))
+
+def replace_broken_pool(pool: ProcessPoolExecutor) -> None:
+    """Swap in a fresh pool once a worker has died and broken `pool`.
+
+    By now request threads are running, so the new workers come from a
+    forkserver rather than forking this process with its locks held."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not pool:
+            return  # Another job already replaced it
+        pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = process_pool(_process_workers, 'forkserver')
+    print(f"Replaced the broken segmentation process pool ({_process_workers} workers)")
+
+def split_chunks(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Split text into pieces of roughly `size` characters, each ending on a boundary"""
+    chunks, start = [], 0
+    while len(text) - start > size:
+        cut = max(text.rfind(b, start, start + size) for b in BOUNDARIES)
+        if cut < 0:
+            cut = min((i for i in (text.find(b, start + size) for b in BOUNDARIES) if i >= 0), default=-1)
+            if cut < 0:
+                break
+        chunks.append(text[start:cut + 1])
+        start = cut + 1
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+def _cut_lengths(chunk: str) -> bytes:
+    """Worker-side cut, returning token lengths so little crosses the process boundary"""
+    return array('I', (len(token) for token in jieba.cut(chunk))).tobytes()
+
+def chunk_lengths(chunk: str, future: Future) -> array:
+    """A worker's token lengths for chunk, checked to cover it exactly"""
+    lengths = array('I')
+    lengths.frombytes(future.result())
+    if sum(lengths) != len(chunk):
+        raise ValueError(f"Worker returned tokens covering {sum(lengths)} of {len(chunk)} characters")
+    return lengths
+
+def cut_parallel(text: str, pool: ProcessPoolExecutor) -> Iterator[array]:
+    """Token lengths for each chunk of text, in order, cut across the pool's workers"""
+    chunks = split_chunks(text)
+    for chunk, future in zip(chunks, [pool.submit(_cut_lengths, chunk) for chunk in chunks]):
+        yield chunk_lengths(chunk, future)
+
+class SegmentationJob:
+    """Segments a text with jieba, handing out tokens as they are produced.
+
+    The first page is cut synchronously by start(); the rest is consumed on a
+    background thread while readers wait only for the tokens they need."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.words = TokenSpans(text)
+        self.done = False
+        self.cancelled = False
+        self._tokens = jieba.cut(text)
+        self._cond = threading.Condition()
+        self._futures: List[Future] = []
+
+    def _take(self, n: int) -> bool:
+        """Consume up to n more tokens; returns False once the text is exhausted"""
+        batch = []
+        with metrics.SEGMENTATION_SECONDS.time():
+            for token in self._tokens:
+                batch.append(token)
+                if len(batch) >= n:
+                    break
+        with self._cond:
+            self.words.extend(batch)
+            if len(batch) < n:
+                self.done = True
+            self._cond.notify_all()
+        return not self.done
+
+    def _at_boundary(self) -> bool:
+        end = self.words.ends[-1] if len(self.words) else 0
+        return end == 0 or self.text[end - 1] in BOUNDARIES
+
+    def _end(self) -> int:
+        return self.words.ends[-1] if len(self.words) else 0
+
+    def _run_parallel(self, pool: ProcessPoolExecutor) -> None:
+        # Finish the current sentence in-process so the rest starts on a boundary
+        while not self._at_boundary():
+            if not self._take(1):
+                return
+        chunks = split_chunks(self.text[self._end():])
+        self._futures = [pool.submit(_cut_lengths, chunk) for chunk in chunks]
+        try:
+            for chunk, future in zip(chunks, self._futures):
+                if self.cancelled:
+                    return
+                # Checked before it is added, so a failure leaves the words
+                # ending on a chunk boundary
+                lengths = chunk_lengths(chunk, future)
+                with self._cond:
+                    self.words.extend_lengths(lengths)
+                    self._cond.notify_all()
+        finally:
+            for future in self._futures:
+                future.cancel()
+        # Everything is segmented; the in-process tokens are not needed
+        self._tokens = iter(())
+
+    def _run(self, on_complete: Optional[Callable]) -> None:
+        try:
+            pool = _process_pool
+            if pool is not None and len(self.text) - self._end() >= PARALLEL_MIN_CHARS:
+                try:
+                    self._run_parallel(pool)
+                except Exception as e:
+                    print(f"Parallel segmentation failed at offset {self._end()}, finishing in-process: {e!r}")
+                    if isinstance(e, BrokenProcessPool):
+                        replace_broken_pool(pool)
+                    self._tokens = jieba.cut(self.text[self._end():])
+            while not self.cancelled and self._take(BATCH_SIZE):
+                pass
+        except Exception as e:
+            # Keep the document readable: the rest is shown a character at a time
+            print(f"Segmentation failed at offset {self._end()}, splitting the rest into characters: {e!r}")
+            with self._cond:
+                self.words.extend_lengths([1] * (len(self.text) - self._end()))
+        finally:
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+        if on_complete and not self.cancelled:
+            try:
+                on_complete(self)
+            except Exception as e:
+                print(f"Segmentation completion handler failed: {e!r}")
+
+    def start(self, first: int, on_complete: Optional[Callable] = None) -> 'SegmentationJob':
+        """Segment the first `first` tokens now and the rest in the background.
+
+        Split from construction so callers can register the job before
+        on_complete can possibly run."""
+        if self._take(first):
+            _executor.submit(self._run, on_complete)
+        elif on_complete:
+            on_complete(self)
+        return self
+
+    def wait_for(self, n: int, timeout: Optional[float] = None) -> None:
+        """Block until at least n tokens exist or segmentation has finished"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or len(self.words) >= n, timeout)
+
+    def cancel(self) -> None:
+        """Stop the background worker after its current batch, dropping queued chunks"""
+        self.cancelled = True
+        for future in self._futures:
+            future.cancel()
+
+def start(text: str, first: int, on_complete: Optional[Callable] = None) -> SegmentationJob:
+    """Segment the first `first` tokens now and the rest in the background"""
+    return SegmentationJob(text).start(first, on_complete)
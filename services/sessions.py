@@ -0,0 +1,15 @@
+import hashlib
+import uuid
+
+def session_id(session) -> str:
+    """Stable id for the browser session, stored in the signed session cookie"""
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def session_label(sid: str) -> str:
+    """Short one-way label for a session id, for stats and logs.
+
+    The id itself is a bearer credential for the session's documents and
+    reviews, so it is never reported; the label only tells sessions apart."""
+    return hashlib.blake2b(sid.encode(), digest_size=6).hexdigest()
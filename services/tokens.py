@@ -0,0 +1,107 @@
+import operator
+import sys
+import zlib
+from array import array
+from itertools import accumulate, chain, islice
+from typing import Iterable
+
+class TokenSpans:
+    """Segmented text stored as token end offsets into the source string.
+
+    jieba tokens tile the text exactly, so each token is text[end[i-1]:end[i]].
+    That costs 4 bytes per token instead of a str object (50+ bytes each), and
+    strings are only materialised for the tokens actually being rendered."""
+
+    __slots__ = ('text', 'ends')
+
+    def __init__(self, text: str, ends: array = None):
+        self.text = text
+        self.ends = ends if ends is not None else array('I')
+
+    @classmethod
+    def from_tokens(cls, text: str, tokens: Iterable[str]) -> 'TokenSpans':
+        spans = cls(text)
+        spans.extend(tokens)
+        return spans
+
+    @classmethod
+    def from_bytes(cls, text: str, data: bytes) -> 'TokenSpans':
+        """Rebuild spans from to_bytes() output"""
+        ends = array('I')
+        ends.frombytes(data)
+        return cls(text, ends)
+
+    def to_bytes(self) -> bytes:
+        return self.ends.tobytes()
+
+    @classmethod
+    def from_compressed(cls, text: str, data: bytes) -> 'TokenSpans':
+        """Rebuild spans from to_compressed() output"""
+        lengths = array(chr(data[0]))
+        lengths.frombytes(zlib.decompress(data[1:]))
+        ends = array('I', accumulate(lengths))
+        if (ends[-1] if ends else 0) != len(text):
+            raise ValueError(f"Token lengths cover {ends[-1] if ends else 0} characters, text has {len(text)}")
+        return cls(text, ends)
+
+    def to_compressed(self) -> bytes:
+        """Token lengths in the narrowest integer type, zlib-compressed.
+
+        Lengths are small and repetitive where the ends never are, so this
+        comes to roughly 2 bits per token against to_bytes()'s 32. The first
+        byte is the array typecode the lengths were stored with."""
+        lengths = list(map(operator.sub, self.ends, chain((0,), self.ends)))
+        longest = max(lengths, default=0)
+        typecode = 'B' if longest < 1 << 8 else 'H' if longest < 1 << 16 else 'I'
+        return typecode.encode() + zlib.compress(array(typecode, lengths).tobytes())
+
+    def append(self, token: str) -> None:
+        start = self.ends[-1] if self.ends else 0
+        if not self.text.startswith(token, start):
+            raise ValueError(f"Token {token!r} does not continue the text at offset {start}")
+        self.ends.append(start + len(token))
+
+    def extend(self, tokens: Iterable[str]) -> None:
+        for token in tokens:
+            self.append(token)
+
+    def extend_lengths(self, lengths: Iterable[int], expected_end: int = None) -> None:
+        """Append tokens given only their lengths, e.g. as returned by a worker process"""
+        start = self.ends[-1] if self.ends else 0
+        self.ends.extend(islice(accumulate(lengths, initial=start), 1, None))
+        end = self.ends[-1] if self.ends else 0
+        if expected_end is not None and end != expected_end:
+            raise ValueError(f"Token lengths end at offset {end}, expected {expected_end}")
+
+    def span(self, i: int) -> tuple:
+        """(start, end) offsets of token i"""
+        if i < 0:
+            i += len(self.ends)
+        return (self.ends[i - 1] if i > 0 else 0), self.ends[i]
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self.ends))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            text, tokens = self.text, []
+            prev = self.ends[start - 1] if start > 0 else 0
+            for end in self.ends[start:stop]:
+                tokens.append(text[prev:end])
+                prev = end
+            return tokens
+        start, end = self.span(i)
+        return self.text[start:end]
+
+    def __iter__(self):
+        text, start = self.text, 0
+        for end in self.ends:
+            yield text[start:end]
+            start = end
+
+    def memory_usage(self) -> int:
+        """Bytes held by the offsets (the source text is shared, not counted)"""
+        return sys.getsizeof(self.ends)
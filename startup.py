@@ -0,0 +1,85 @@
+import threading
+import time
+from contextlib import contextmanager
+import jieba
+
+class Startup:
+    """Tracks the application's startup phases and whether it is ready for traffic"""
+
+    def __init__(self):
+        self.phases = {}
+        self.started_at = None
+        self.finished_at = None
+        self._ready = threading.Event()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase"""
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            print(f"Startup: {name} took {self.phases[name]:.2f}s")
+
+    def in_background(self, name: str, func) -> None:
+        """Run a phase on a background thread; the app is not ready until it finishes"""
+        with self._lock:
+            self._pending.add(name)
+
+        def run():
+            with self.phase(name):
+                func()
+            with self._lock:
+                self._pending.discard(name)
+                done = not self._pending and self.finished_at is not None
+            if done:
+                self._mark_ready()
+
+        threading.Thread(target=run, name=f'startup-{name}', daemon=True).start()
+
+    def finish(self) -> None:
+        """Mark the synchronous phases done; ready once background phases are too"""
+        with self._lock:
+            self.finished_at = time.perf_counter()
+            done = not self._pending
+        if done:
+            self._mark_ready()
+
+    def _mark_ready(self) -> None:
+        self._ready.set()
+        print(f"Startup: ready after {self.total():.2f}s")
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def total(self) -> float:
+        return (time.perf_counter() - self.started_at) if self.started_at is not None else 0.0
+
+    def report(self) -> dict:
+        """Readiness and per-phase timings in seconds"""
+        with self._lock:
+            pending = sorted(self._pending)
+        return {
+            'ready': self.ready,
+            'pending': pending,
+            'phases': dict(self.phases),
+            'total': self.total() if not self.ready else sum(self.phases.values()),
+        }
+
+def prewarm_jieba(cache_dir=None) -> None:
+    """Build (or load from cache) jieba's prefix dictionary ahead of the first request.
+
+    By default jieba caches the built model in the system temp directory,
+    which is often wiped between deploys; cache_dir keeps it somewhere durable."""
+    if cache_dir:
+        jieba.dt.tmp_dir = str(cache_dir)
+    jieba.initialize()
@@ -0,0 +1,55 @@
+// Batched flashcard review: answers are queued in localStorage and posted to
+// /review/answers every few cards or seconds, instead of one request per card.
+window.reviewQueue = window.reviewQueue || (() => {
+    const KEY = 'review-answers';
+    const BATCH = 5;
+    const INTERVAL = 10000;
+    const load = () => JSON.parse(localStorage.getItem(KEY) || '[]');
+    const store = answers => localStorage.setItem(KEY, JSON.stringify(answers));
+    let flushing = null;
+
+    function flush() {
+        if (flushing) return flushing;
+        const answers = load();
+        if (!answers.length) return Promise.resolve();
+        flushing = fetch('/review/answers', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({answers}),
+            credentials: 'same-origin',
+            keepalive: true,
+        })
+            // Drop only what was sent; answers queued meanwhile stay for the next flush
+            .then(response => { if (response.ok) store(load().slice(answers.length)); })
+            .catch(() => {})  // offline: keep the queue and retry on the next flush
+            .finally(() => { flushing = null; });
+        return flushing;
+    }
+
+    function reveal(button) {
+        const card = button.closest('.deck-card');
+        card.querySelector('.flashcard-answer').hidden = false;
+        button.hidden = true;
+    }
+
+    async function answer(button, correct) {
+        const card = button.closest('.deck-card');
+        // The id lets the server skip an answer it applied before the response was lost
+        const id = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+        store([...load(), {id, word: card.dataset.word, correct, at: Date.now() / 1000}]);
+        card.hidden = true;
+        const next = card.nextElementSibling;
+        if (next && next.classList.contains('deck-card')) {
+            next.hidden = false;
+            if (load().length >= BATCH) flush();
+            return;
+        }
+        await flush();
+        htmx.ajax('POST', '/end-review', {target: '#review-area'});
+    }
+
+    setInterval(flush, INTERVAL);
+    window.addEventListener('pagehide', flush);
+    flush();  // anything left over from an earlier visit
+    return {answer, reveal, flush};
+})();
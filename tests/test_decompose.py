@@ -0,0 +1,13 @@
+from decompose import HeadwordTrie
+
+def test_segment_prefers_headwords():
+    trie = HeadwordTrie(['中国', '中国人', '人民'])
+    assert trie.segment('中国人民') == [('中国', True), ('人民', True)]
+
+def test_segment_skips_a_character_for_a_longer_headword():
+    # Matching 'AB' would leave 'C' and 'D' unknown; skipping 'A' matches 'BCD'
+    assert HeadwordTrie(['AB', 'BCD']).segment('ABCD') == [('A', False), ('BCD', True)]
+
+def test_segment_unknown_characters():
+    assert HeadwordTrie(['AB']).segment('XAB') == [('X', False), ('AB', True)]
+    assert HeadwordTrie([]).segment('XY') == [('X', False), ('Y', False)]
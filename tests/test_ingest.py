@@ -0,0 +1,46 @@
+import sqlite3
+import ingest
+
+# Fifteen entries, so positions run past 10 where text sorts '10' before '2'
+HEADWORDS = '一二三四五六七八九十百千万亿零'
+
+def write_cedict(path, headwords=HEADWORDS) -> None:
+    path.write_text(''.join(f'{h} {h} [yi1] /sense {i}/\n' for i, h in enumerate(headwords)), encoding='utf-8')
+
+def file_order(db_path) -> list:
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute('SELECT simplified FROM entries ORDER BY position')]
+
+def build_without_position(tmp_path):
+    cedict, db_path = tmp_path / 'cedict.txt', tmp_path / 'dictionary.db'
+    write_cedict(cedict)
+    ingest.build(db_path, cedict, progress=None)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('DROP INDEX idx_position')
+        conn.execute('ALTER TABLE entries DROP COLUMN position')
+    return cedict, db_path
+
+def test_migrate_adds_integer_position(tmp_path):
+    cedict, db_path = build_without_position(tmp_path)
+    ingest.migrate(db_path)
+    assert file_order(db_path) == list(HEADWORDS)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries WHERE typeof(position) != 'integer'").fetchone() == (0,)
+
+def test_migrate_converts_text_position(tmp_path):
+    # What migrate() used to leave behind: position declared TEXT
+    cedict, db_path = build_without_position(tmp_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('ALTER TABLE entries ADD COLUMN position TEXT')
+        conn.execute('UPDATE entries SET position = rowid')
+    ingest.migrate(db_path)
+    assert file_order(db_path) == list(HEADWORDS)
+
+def test_update_after_migrate_moves_nothing(tmp_path):
+    cedict, db_path = build_without_position(tmp_path)
+    ingest.migrate(db_path)
+    order = file_order(db_path)
+    write_cedict(cedict, HEADWORDS + '兆')
+    stats = ingest.update(db_path, cedict, progress=None)
+    assert (stats.inserted, stats.updated, stats.deleted) == (1, 0, 0)
+    assert file_order(db_path) == order + ['兆']